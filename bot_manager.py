@@ -8,14 +8,26 @@ import os
 import re
 import tempfile
 import time
-from typing import Dict, List, Optional, Any, Tuple
-from io import BytesIO
-from datetime import datetime
+import traceback
+from collections import OrderedDict, deque
+from contextlib import suppress
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-from telegram import Bot, InputMediaPhoto, InputMediaVideo, InputMediaDocument, MessageEntity, InputFile
-from telegram.error import TelegramError, BadRequest, Forbidden
+from telegram import (
+    Bot, MessageEntity, InputFile, User,
+    InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
+)
+from telegram.error import BadRequest, Forbidden
 from telethon.tl.types import (
-    MessageMediaPhoto, MessageMediaDocument
+    MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage,
+    DocumentAttributeFilename, DocumentAttributeVideo, DocumentAttributeAudio, DocumentAttributeImageSize,
+    DocumentAttributeSticker, DocumentAttributeAnimated,
+    MessageEntityBold, MessageEntityItalic, MessageEntityCode, MessageEntityPre, MessageEntityStrike,
+    MessageEntityUnderline, MessageEntitySpoiler, MessageEntityUrl, MessageEntityTextUrl,
+    MessageEntityMention, MessageEntityMentionName, MessageEntityCustomEmoji, MessageEntityHashtag,
+    MessageEntityCashtag, MessageEntityBotCommand, MessageEntityEmail, MessageEntityPhone
 )
 
 from database import DatabaseManager, MessagePair, MessageMapping
@@ -26,9 +38,419 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+_MARKDOWN_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+
+# URL patterns that typically generate webpage previews, fused into one alternation
+# so each check is a single scan of the text
+_URL_ANY_RE = re.compile('|'.join(f'(?:{p})' for p in (
+    r'https?://[^\s<>")\]]+',                       # HTTP/HTTPS URLs (exclude ) and ])
+    r'www\.[^\s<>")\]]+\.[a-zA-Z]{2,}[^\s<>")\]]*', # www URLs with domain and optional path
+    r't\.me/[^\s<>")\]]+',                          # Telegram links
+    r'(?<![a-zA-Z0-9@])[a-zA-Z0-9.-]+\.(com|org|net|edu|gov|co|io|tv|me|ly|to|cc|repl|dev|app)[^\s<>")\]]*', # Common TLD URLs (exclude emails)
+    r'ftp://[^\s<>")\]]+',                          # FTP URLs
+    r'[a-zA-Z0-9.-]+\.replit\.com[^\s<>")\]]*',     # Replit URLs
+    r'[a-zA-Z0-9.-]+\.replit\.app[^\s<>")\]]*',     # Replit app URLs
+)), re.IGNORECASE)
+# Simple patterns for URLs that might be missed
+_SIMPLE_URL_RES = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(/[^\s]*)?',     # Basic domain.tld pattern
+    r'(?:^|\s)([\w.-]+\.[\w]{2,})(?:\s|$)',        # Domain at word boundaries
+))
+
+# Entity conversion for payloads above these sizes runs in a worker thread
+_OFFLOAD_TEXT_LENGTH = 8192
+_OFFLOAD_ENTITY_COUNT = 64
+
+def _utf16_len(text: str) -> int:
+    """Length of text in UTF-16 code units, encoding only when astral characters are present"""
+    if text.isascii() or max(text) <= '\uffff':
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+class BlockedWordMatcher:
+    """Case-insensitive substring matcher for a blocked word list"""
+    
+    # Below this many words a fused regex is as fast as building an automaton
+    AUTOMATON_THRESHOLD = 64
+    
+    def __init__(self, words: Tuple[str, ...]):
+        # Longest first so overlapping words report the most specific match
+        self.words = sorted({word.strip() for word in words if isinstance(word, str) and word.strip()}, key=len, reverse=True)
+        self.backend = "regex"
+        self._hs_db = None
+        self._automaton = None
+        self._regex = None
+        
+        if len(self.words) >= self.AUTOMATON_THRESHOLD and HYPERSCAN_AVAILABLE:
+            try:
+                flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+                self._hs_db = hyperscan.Database()
+                self._hs_db.compile(
+                    expressions=[re.escape(word).encode('utf-8') for word in self.words],
+                    ids=list(range(len(self.words))),
+                    elements=len(self.words),
+                    flags=[flags] * len(self.words)
+                )
+                self.backend = "hyperscan"
+                return
+            except Exception as e:
+                logger.warning(f"Hyperscan compile failed, falling back: {e}")
+                self._hs_db = None
+        
+        if len(self.words) >= self.AUTOMATON_THRESHOLD and AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for word in self.words:
+                self._automaton.add_word(word.casefold(), word)
+            self._automaton.make_automaton()
+            self.backend = "ahocorasick"
+            return
+        
+        if self.words:
+            self._regex = re.compile('|'.join(re.escape(word) for word in self.words), re.IGNORECASE)
+    
+    def search(self, text: str) -> Optional[str]:
+        """Return the first blocked word found in text, or None"""
+        if self._hs_db is not None:
+            found = []
+            
+            def on_match(word_id, start, end, flags, context):
+                found.append(self.words[word_id])
+                return True  # Stop scanning at the first hit
+            
+            try:
+                self._hs_db.scan(text.encode('utf-8'), match_event_handler=on_match)
+            except getattr(hyperscan, 'ScanTerminated', ()):
+                pass
+            return found[0] if found else None
+        
+        if self._automaton is not None:
+            for _, word in self._automaton.iter(text.casefold()):
+                return word
+            return None
+        
+        if self._regex is not None:
+            match = self._regex.search(text)
+            return match.group() if match else None
+        
+        return None
+
+@lru_cache(maxsize=256)
+def _get_word_matcher(words: Tuple[str, ...]) -> BlockedWordMatcher:
+    """Build one matcher per distinct word list"""
+    return BlockedWordMatcher(words)
+
+# Texts up to this length have their URL / blocked-word scan results cached, since reposts repeat them
+_RESULT_CACHE_MAX_TEXT = 4096
+
+@lru_cache(maxsize=2048)
+def _cached_word_search(matcher: BlockedWordMatcher, text: str) -> Optional[str]:
+    """Blocked-word search memoized per matcher and text"""
+    return matcher.search(text)
+
+def _search_words(matcher: BlockedWordMatcher, text: str) -> Optional[str]:
+    """Search for a blocked word, using the result cache for texts short enough to key on"""
+    if len(text) <= _RESULT_CACHE_MAX_TEXT:
+        return _cached_word_search(matcher, text)
+    return matcher.search(text)
+
+def _find_url(text: str) -> Optional[str]:
+    """Return the first URL in text, checking inside markdown links first"""
+    for link_text, link_url in _MARKDOWN_LINK_RE.findall(text):
+        if _URL_ANY_RE.search(link_url):
+            return f"[{link_text}]({link_url})"
+    match = _URL_ANY_RE.search(text)
+    return match.group() if match else None
+
+_cached_find_url = lru_cache(maxsize=2048)(_find_url)
+
+# Telethon media classes that map straight to a type; documents are resolved from attributes and MIME type
+_MEDIA_CLASS_TYPES = {
+    MessageMediaPhoto: "photo",
+    MessageMediaWebPage: "webpage",
+}
+# MIME prefixes that map to a media type, checked in one startswith call; the first letter picks the type
+_MIME_MEDIA_PREFIXES = ('image/', 'video/', 'audio/')
+_MIME_PREFIX_TYPES = {'i': 'photo', 'v': 'video', 'a': 'audio'}
+
+# Media types that can be sent as part of a media group. Telegram only groups photos with videos,
+# documents with documents and audio with audio; each type maps to its InputMedia class and extra attributes
+_ALBUM_FAMILIES = {'photo': 'visual', 'video': 'visual', 'document': 'document', 'audio': 'audio'}
+_ALBUM_INPUT_MEDIA = {
+    'photo': (InputMediaPhoto, ()),
+    'video': (InputMediaVideo, (('duration', 'duration'), ('width', 'width'), ('height', 'height'))),
+    'document': (InputMediaDocument, ()),
+    'audio': (InputMediaAudio, (('duration', 'duration'),)),
+}
+_MEDIA_GROUP_MAX_ITEMS = 10
+
+# Telegram's maximum upload.getFile part size; Telethon defaults to 128 KB for files under 100 MB
+_DOWNLOAD_PART_SIZE_KB = 512
+
+# Document attribute class -> media type, checked in attribute order
+_ATTR_MEDIA_TYPES = {
+    DocumentAttributeSticker: lambda a: "sticker",
+    DocumentAttributeAnimated: lambda a: "animation",
+    DocumentAttributeVideo: lambda a: "video_note" if a.round_message else "video",
+    DocumentAttributeAudio: lambda a: "voice" if a.voice else "audio",
+}
+
+# Entity type constants bound once so the factories below skip the class attribute lookup
+_ME = MessageEntity
+_BOLD = MessageEntity.BOLD
+_ITALIC = MessageEntity.ITALIC
+_CODE = MessageEntity.CODE
+_PRE = MessageEntity.PRE
+_STRIKETHROUGH = MessageEntity.STRIKETHROUGH
+_UNDERLINE = MessageEntity.UNDERLINE
+_SPOILER = MessageEntity.SPOILER
+_URL = MessageEntity.URL
+_TEXT_LINK = MessageEntity.TEXT_LINK
+_MENTION = MessageEntity.MENTION
+_TEXT_MENTION = MessageEntity.TEXT_MENTION
+_CUSTOM_EMOJI = MessageEntity.CUSTOM_EMOJI
+_HASHTAG = MessageEntity.HASHTAG
+_CASHTAG = MessageEntity.CASHTAG
+_BOT_COMMAND = MessageEntity.BOT_COMMAND
+_EMAIL = MessageEntity.EMAIL
+_PHONE_NUMBER = MessageEntity.PHONE_NUMBER
+
+# Telethon entity class -> factory(entity, offset, length) building the python-telegram-bot entity (None to drop it)
+_ENTITY_FACTORIES = {
+    MessageEntityBold: lambda e, o, l: _ME(_BOLD, o, l),
+    MessageEntityItalic: lambda e, o, l: _ME(_ITALIC, o, l),
+    MessageEntityCode: lambda e, o, l: _ME(_CODE, o, l),
+    MessageEntityPre: lambda e, o, l: _ME(_PRE, o, l, language=e.language or None),
+    MessageEntityStrike: lambda e, o, l: _ME(_STRIKETHROUGH, o, l),
+    MessageEntityUnderline: lambda e, o, l: _ME(_UNDERLINE, o, l),
+    MessageEntitySpoiler: lambda e, o, l: _ME(_SPOILER, o, l),
+    MessageEntityUrl: lambda e, o, l: _ME(_URL, o, l),
+    MessageEntityTextUrl: lambda e, o, l: _ME(_TEXT_LINK, o, l, url=e.url) if e.url else None,
+    MessageEntityMention: lambda e, o, l: _ME(_MENTION, o, l),
+    MessageEntityMentionName: lambda e, o, l: _ME(
+        _TEXT_MENTION, o, l, user=User(id=e.user_id, first_name="", is_bot=False)
+    ) if e.user_id else None,
+    MessageEntityCustomEmoji: lambda e, o, l: _ME(_CUSTOM_EMOJI, o, l, custom_emoji_id=str(e.document_id)) if e.document_id else None,
+    MessageEntityHashtag: lambda e, o, l: _ME(_HASHTAG, o, l),
+    MessageEntityCashtag: lambda e, o, l: _ME(_CASHTAG, o, l),
+    MessageEntityBotCommand: lambda e, o, l: _ME(_BOT_COMMAND, o, l),
+    MessageEntityEmail: lambda e, o, l: _ME(_EMAIL, o, l),
+    MessageEntityPhone: lambda e, o, l: _ME(_PHONE_NUMBER, o, l),
+}
+# Same table keyed by class name, for entity objects that are not Telethon instances
+_ENTITY_FACTORIES_BY_NAME = {cls.__name__: factory for cls, factory in _ENTITY_FACTORIES.items()}
+
+# Optional DFA backends for large blocked-word lists
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    hyperscan = None
+    HYPERSCAN_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    ahocorasick = None
+    AHOCORASICK_AVAILABLE = False
+
+@dataclass(slots=True)
+class ProcessorStats:
+    """Processing counters, kept as slot attributes since they are bumped on every message"""
+    messages_processed: int = 0
+    messages_copied: int = 0
+    messages_filtered: int = 0
+    errors: int = 0
+    media_processed: int = 0
+    mapping_cache_hits: int = 0
+    mapping_cache_misses: int = 0
+
+class ChatSendWorker:
+    """Runs send jobs for one destination chat one at a time, in submission order"""
+    
+    def __init__(self, chat_id: int, idle_timeout: float, on_idle: Callable[[int], Any]):
+        self.chat_id = chat_id
+        self.idle_timeout = idle_timeout
+        self._on_idle = on_idle
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # Set whenever a job is queued; the worker waits on this rather than on the queue itself
+        self._has_jobs = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+    
+    async def submit(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        """Queue a send job and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((job, future))
+        self._has_jobs.set()
+        return await future
+    
+    async def stop(self):
+        """Cancel the worker task and any jobs still queued"""
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        # Nothing will run the remaining jobs; cancel their futures so submitters don't wait forever
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if not future.done():
+                future.cancel()
+    
+    async def _run(self):
+        """Process queued jobs until idle for idle_timeout seconds"""
+        while True:
+            try:
+                job, future = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                # Time out on the event, not on queue.get(): a timed-out get() can swallow a job that
+                # arrived just as the timeout fired, leaving its submitter waiting forever
+                self._has_jobs.clear()
+                try:
+                    await asyncio.wait_for(self._has_jobs.wait(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if self._queue.empty():
+                        self._on_idle(self.chat_id)
+                        return
+                continue
+            if future.cancelled():
+                continue
+            try:
+                future.set_result(await job())
+            except asyncio.CancelledError:
+                # Stopped mid-send: release the submitter before exiting
+                future.cancel()
+                raise
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+
+class MappingLoader:
+    """Coalesces message mapping lookups made within a short window into one query per pair"""
+    
+    def __init__(self, db_manager: DatabaseManager, window: float = 0.005,
+                 before_flush: Optional[Callable[[], Awaitable[Any]]] = None):
+        self.db_manager = db_manager
+        self.window = window
+        self._before_flush = before_flush
+        self._pending: Dict[Tuple[int, int], List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+    
+    async def load(self, source_message_id: int, pair_id: int) -> Optional[MessageMapping]:
+        """Queue a lookup for the current window and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault((source_message_id, pair_id), []).append(future)
+        if self._timer is None:
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+        return await future
+    
+    def _schedule_flush(self):
+        """Start a flush of the current window"""
+        self._timer = None
+        pending, self._pending = self._pending, {}
+        task = asyncio.create_task(self._flush(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _flush(self, pending: Dict[Tuple[int, int], List[asyncio.Future]]):
+        """Issue one IN-query per pair and resolve the waiting futures"""
+        try:
+            if self._before_flush:
+                await self._before_flush()
+            by_pair: Dict[int, List[int]] = {}
+            for source_message_id, pair_id in pending:
+                by_pair.setdefault(pair_id, []).append(source_message_id)
+            found: Dict[Tuple[int, int], MessageMapping] = {}
+            for pair_id, source_ids in by_pair.items():
+                for source_message_id, mapping in (await self.db_manager.get_message_mappings_bulk(source_ids, pair_id)).items():
+                    found[(source_message_id, pair_id)] = mapping
+            for key, futures in pending.items():
+                mapping = found.get(key)
+                for future in futures:
+                    if not future.done():
+                        future.set_result(mapping)
+        except BaseException as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+class AlbumItem(NamedTuple):
+    """One processed message of an album, waiting to be sent as part of a media group"""
+    bot: Bot
+    chat_id: int
+    source_message_id: int
+    media_info: Dict
+    content: str
+    entities: List
+    reply_to_message_id: Optional[int]
+
+class AlbumAggregator:
+    """Collects the messages of one album for a short window so they can be sent as a single media group"""
+    
+    def __init__(self, window: float, send_group: Callable[[List[AlbumItem]], Awaitable[List[Optional[int]]]]):
+        self.window = window
+        self._send_group = send_group
+        self._groups: Dict[Any, List[Tuple[AlbumItem, asyncio.Future]]] = {}
+        self._tasks: set = set()
+    
+    async def submit(self, key: Any, item: AlbumItem) -> Optional[int]:
+        """Add an item to its album and wait for the destination message ID it was sent as"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = []
+            loop.call_later(self.window, self._schedule_flush, key)
+        group.append((item, future))
+        return await future
+    
+    def _schedule_flush(self, key: Any):
+        """Start sending an album whose window has closed"""
+        group = self._groups.pop(key, None)
+        if group:
+            task = asyncio.create_task(self._flush(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _flush(self, group: List[Tuple[AlbumItem, asyncio.Future]]):
+        """Send the album and resolve each item's future with its message ID"""
+        try:
+            results = await self._send_group([item for item, _ in group])
+            for (_, future), result in zip(group, results):
+                if not future.done():
+                    future.set_result(result)
+        except BaseException as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
 class MessageProcessor:
     """Advanced message processor with filtering and media handling"""
     
+    # media type -> (Bot method, Bot API endpoint, file argument, extra (kwarg, media_info key) pairs)
+    _MEDIA_SENDERS = {
+        'photo': ('send_photo', 'sendPhoto', 'photo', ()),
+        'video': ('send_video', 'sendVideo', 'video', (('duration', 'duration'), ('width', 'width'), ('height', 'height'))),
+        'animation': ('send_animation', 'sendAnimation', 'animation', (('duration', 'duration'), ('width', 'width'), ('height', 'height'))),
+        'document': ('send_document', 'sendDocument', 'document', (('filename', 'filename'),)),
+        'audio': ('send_audio', 'sendAudio', 'audio', (('duration', 'duration'),)),
+        'voice': ('send_voice', 'sendVoice', 'voice', (('duration', 'duration'),)),
+        'video_note': ('send_video_note', 'sendVideoNote', 'video_note', (('duration', 'duration'), ('length', 'width'))),
+        'sticker': ('send_sticker', 'sendSticker', 'sticker', ()),
+    }
+    # Media types the Bot API does not accept a caption for
+    _CAPTIONLESS_MEDIA = frozenset({'video_note', 'sticker'})
+    
     def __init__(self, db_manager: DatabaseManager, config: Config):
         self.db_manager = db_manager
         self.config = config
@@ -37,140 +459,246 @@ class MessageProcessor:
         self.topic_manager = TopicManager(db_manager, config)
         
         # Processing statistics
-        self.stats = {
-            'messages_processed': 0,
-            'messages_copied': 0,
-            'messages_filtered': 0,
-            'errors': 0,
-            'media_processed': 0
-        }
+        self.stats = ProcessorStats()
+        
+        # (source message ID, pair ID) -> (message mapping, cached at), in LRU order
+        self._mapping_cache: OrderedDict[Tuple[int, int], Tuple[MessageMapping, float]] = OrderedDict()
+        self._mapping_loader = MappingLoader(db_manager, before_flush=self.flush_mappings)
+        self._album_aggregator = AlbumAggregator(config.MEDIA_GROUP_WINDOW, self._send_album)
+        
+        # Bounds concurrent Telethon media downloads across all pairs
+        self._download_semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_DOWNLOADS)
+        
+        # Per-destination send workers, evicted after CHAT_WORKER_IDLE_TIMEOUT seconds idle
+        self._chat_workers: Dict[int, ChatSendWorker] = {}
+        
+        # Reserved send times per destination chat for the sliding-window rate limit
+        self._chat_send_slots: Dict[int, deque] = {}
+        
+        # Global blocked-word matcher, built once from config
+        self._global_word_matcher = _get_word_matcher(tuple(self._get_global_blocked_words()))
+        
+        # Pair stats are buffered here and written in batches by _flush_stats_loop
+        self._stats_dirty: Dict[int, MessagePair] = {}
+        # New message mappings, written in batches alongside the pair stats
+        self._pending_mappings: List[MessageMapping] = []
+        # (chat_id, media message ID) -> follow-up message holding its caption overflow, claimed by the mapping
+        self._caption_overflow_ids: Dict[Tuple[int, int], int] = {}
+        self._stats_flusher: Optional[asyncio.Task] = None
     
     async def initialize(self):
         """Initialize message processor components"""
         await self.message_filter.initialize()
         await self.topic_manager.initialize()
+        self._stats_flusher = asyncio.create_task(self._flush_stats_loop())
+    
+    async def shutdown(self):
+        """Stop background tasks and write any pending stats"""
+        if self._stats_flusher:
+            self._stats_flusher.cancel()
+            try:
+                await self._stats_flusher
+            except asyncio.CancelledError:
+                pass
+            self._stats_flusher = None
+        for worker in list(self._chat_workers.values()):
+            await worker.stop()
+        self._chat_workers.clear()
+        await self.flush_mappings()
+        await self.flush_stats()
+    
+    def _get_chat_worker(self, chat_id: int) -> "ChatSendWorker":
+        """Get or start the send worker for a destination chat"""
+        worker = self._chat_workers.get(chat_id)
+        if worker is None:
+            worker = ChatSendWorker(chat_id, self.config.CHAT_WORKER_IDLE_TIMEOUT, self._chat_workers.pop)
+            self._chat_workers[chat_id] = worker
+        return worker
+    
+    def _mark_pair_dirty(self, pair: MessagePair):
+        """Queue pair stats for the next batched write"""
+        self._stats_dirty[pair.id] = pair
+    
+    async def flush_stats(self):
+        """Write all buffered pair stats in one transaction"""
+        if not self._stats_dirty:
+            return
+        pending, self._stats_dirty = self._stats_dirty, {}
+        try:
+            await self.db_manager.update_pairs_bulk(list(pending.values()))
+        except Exception as e:
+            logger.error(f"Error flushing pair stats: {e}")
+            # Keep the pairs queued for the next attempt unless re-marked meanwhile
+            for pair_id, pair in pending.items():
+                self._stats_dirty.setdefault(pair_id, pair)
+    
+    async def flush_mappings(self):
+        """Write all buffered message mappings in one transaction"""
+        if not self._pending_mappings:
+            return
+        pending, self._pending_mappings = self._pending_mappings, []
+        try:
+            await self.db_manager.save_message_mappings_bulk(pending)
+        except Exception as e:
+            logger.error(f"Error flushing message mappings: {e}")
+            # Requeue ahead of anything added meanwhile so the newest mapping still wins
+            self._pending_mappings[:0] = pending
+    
+    async def _flush_stats_loop(self):
+        """Periodically flush buffered message mappings and pair stats"""
+        while True:
+            await asyncio.sleep(self.config.STATS_FLUSH_INTERVAL)
+            await self.flush_mappings()
+            await self.flush_stats()
     
     async def process_new_message(self, event, pair: MessagePair, bot: Bot, bot_index: int) -> bool:
         """Process new message from source chat with enhanced formatting and media support"""
         try:
-            self.stats['messages_processed'] += 1
+            self.stats.messages_processed += 1
             
             # Check global and pair-specific word blocking first
-            message_text = event.text or event.raw_text or ""
+            # Resolve the message text once and pass it down the pipeline
+            message_text = event.raw_text or event.text or ""
+            # Telethon exposes these as properties; read each once
+            ev_id = event.id
+            ev_media = event.media
+            ev_is_reply = event.is_reply
             if self.is_blocked_word(message_text, pair):
                 logger.info(f"Message blocked by word filter (pair {pair.id}): {message_text[:100]}...")
-                self.stats['messages_filtered'] += 1
+                self.stats.messages_filtered += 1
                 pair.stats['messages_filtered'] = pair.stats.get('messages_filtered', 0) + 1
                 pair.stats['words_blocked'] = pair.stats.get('words_blocked', 0) + 1
-                await self.db_manager.update_pair(pair)
+                self._mark_pair_dirty(pair)
                 return True
             
-            # Apply other filters
-            filter_result = await self.message_filter.should_copy_message(event, pair)
+            # Cheap synchronous checks before any network or hashing work
+            filter_result = self.message_filter.quick_reject(event, pair)
+            if filter_result is None:
+                # Apply other filters
+                filter_result = await self.message_filter.should_copy_message(event, pair)
             if not filter_result.should_copy:
                 logger.info(f"Message filtered by {filter_result.filters_applied}: {filter_result.reason} - Content: {message_text[:100]}...")
-                self.stats['messages_filtered'] += 1
+                self.stats.messages_filtered += 1
                 
                 # Update pair stats
                 pair.stats['messages_filtered'] = pair.stats.get('messages_filtered', 0) + 1
-                await self.db_manager.update_pair(pair)
+                self._mark_pair_dirty(pair)
                 return True  # Successfully filtered (not an error)
             
-            # Handle replies first
-            reply_to_message_id = None
-            if event.is_reply and pair.filters.get("preserve_replies", True):
-                reply_to_message_id = await self._find_reply_target(event, pair)
-            
-            # Always use Bot API for consistent sender appearance (not direct forwarding)
-            # Process message content with entities (preserve original formatting)
-            processed_content, processed_entities = await self._process_message_content(event, pair)
-            
-            # Handle media if present - download via Telethon and send via Bot API
-            media_info = None
-            if event.media:
-                # Check image blocking before processing
-                if await self.is_blocked_image(event, pair):
-                    logger.debug("Message blocked: contains blocked image")
-                    self.stats['messages_filtered'] += 1
-                    pair.stats['messages_filtered'] = pair.stats.get('messages_filtered', 0) + 1
-                    pair.stats['images_blocked'] = pair.stats.get('images_blocked', 0) + 1
-                    await self.db_manager.update_pair(pair)
-                    return True
+            # Reply lookup, content processing and the media download are independent, so overlap them
+            media_task = asyncio.create_task(self._fetch_media(event, pair, bot, message_text)) if ev_media else None
+            try:
+                reply_to_message_id = None
+                if ev_is_reply and pair.filter_cfg.preserve_replies:
+                    reply_to_message_id, (processed_content, processed_entities) = await asyncio.gather(
+                        self._find_reply_target(event, pair),
+                        self._process_message_content(event, pair, message_text)
+                    )
+                else:
+                    # Always use Bot API for consistent sender appearance (not direct forwarding)
+                    # Process message content with entities (preserve original formatting)
+                    processed_content, processed_entities = await self._process_message_content(event, pair, message_text)
                 
-                media_info = await self._download_and_prepare_media(event, pair, bot)
+                # Handle media if present - downloaded via Telethon and sent via Bot API
+                media_info, image_blocked = await media_task if media_task else (None, False)
+            except BaseException:
+                if media_task:
+                    self._discard_media_task(media_task)
+                raise
+            
+            if image_blocked:
+                logger.debug("Message blocked: contains blocked image")
+                self.stats.messages_filtered += 1
+                pair.stats['messages_filtered'] = pair.stats.get('messages_filtered', 0) + 1
+                pair.stats['images_blocked'] = pair.stats.get('images_blocked', 0) + 1
+                self._mark_pair_dirty(pair)
+                return True
+            
+            if media_task:
                 logger.info(f"[MEDIA_DEBUG] Media info returned: {media_info is not None}, Type: {media_info.get('type') if media_info else None}")
-                if media_info is False:  # Media blocked
-                    self.stats['messages_filtered'] += 1
-                    pair.stats['messages_filtered'] = pair.stats.get('messages_filtered', 0) + 1
-                    await self.db_manager.update_pair(pair)
-                    return True
             
             # For URL messages without media, ensure webpage previews are enabled
-            # This is crucial for proper URL forwarding
-            contains_urls = bool(processed_content and self._contains_urls(processed_content))
-            if contains_urls:
-                logger.info(f"Message contains URLs, will enable webpage preview: {processed_content[:200]}...")
-            elif processed_content and self._contains_simple_urls(processed_content):
-                contains_urls = True
-                logger.info(f"Message contains simple URLs, will enable webpage preview: {processed_content[:200]}...")
+            # This is crucial for proper URL forwarding; media captions never get a preview
+            contains_urls = False
+            if processed_content and not media_info:
+                contains_urls = self._contains_urls(processed_content) or self._contains_simple_urls(processed_content)
+                if contains_urls and logger.isEnabledFor(logging.INFO):
+                    logger.info(f"Message contains URLs, will enable webpage preview: {processed_content[:200]}...")
             
             # Send message with full entity preservation and proper URL preview handling
-            sent_message = await self._send_message(
-                bot, pair.destination_chat_id, processed_content or "", 
-                media_info, reply_to_message_id, processed_entities or []
-            )
+            # Sends to one destination run in order on its worker; other chats are not held up
+            if (self.config.MEDIA_GROUP_WINDOW > 0 and event.grouped_id
+                    and media_info and media_info.get('type') in _ALBUM_FAMILIES):
+                # Album parts are held briefly and sent together as one media group
+                sent_message_id = await self._album_aggregator.submit(
+                    (pair.id, event.grouped_id),
+                    AlbumItem(bot, pair.destination_chat_id, ev_id, media_info,
+                              processed_content or "", processed_entities or [], reply_to_message_id)
+                )
+            else:
+                sent_message_id = await self._get_chat_worker(pair.destination_chat_id).submit(
+                    lambda: self._send_message(
+                        bot, pair.destination_chat_id, processed_content or "", 
+                        media_info, reply_to_message_id, processed_entities or [], contains_urls
+                    )
+                )
             
-            if sent_message:
+            if sent_message_id:
                 # Save message mapping
                 mapping = MessageMapping(
                     id=0,
-                    source_message_id=event.id,
-                    destination_message_id=sent_message.message_id,
+                    source_message_id=ev_id,
+                    destination_message_id=sent_message_id,
                     pair_id=pair.id,
                     bot_index=bot_index,
                     source_chat_id=pair.source_chat_id,
                     destination_chat_id=pair.destination_chat_id,
                     message_type=self._get_message_type(event),
-                    has_media=bool(event.media),
+                    has_media=bool(ev_media),
                     is_reply=bool(reply_to_message_id),
-                    reply_to_source_id=event.reply_to_msg_id if event.is_reply else None,
-                    reply_to_dest_id=reply_to_message_id
+                    reply_to_source_id=event.reply_to_msg_id if ev_is_reply else None,
+                    reply_to_dest_id=reply_to_message_id,
+                    overflow_message_id=self._caption_overflow_ids.pop((pair.destination_chat_id, sent_message_id), None)
                 )
                 
-                await self.db_manager.save_message_mapping(mapping)
+                self._pending_mappings.append(mapping)
+                if len(self._pending_mappings) >= self.config.BATCH_SIZE:
+                    await self.flush_mappings()
+                # Replies, edits and deletes usually target recent messages, so seed the cache with this one
+                self._cache_mapping(mapping)
                 
                 # Update statistics
-                self.stats['messages_copied'] += 1
+                self.stats.messages_copied += 1
                 pair.stats['messages_copied'] = pair.stats.get('messages_copied', 0) + 1
-                pair.stats['last_activity'] = datetime.now().isoformat()
+                pair.stats['last_activity'] = int(time.time())
                 
-                if event.media:
-                    self.stats['media_processed'] += 1
+                if ev_media:
+                    self.stats.media_processed += 1
                 
                 if reply_to_message_id:
                     pair.stats['replies_preserved'] = pair.stats.get('replies_preserved', 0) + 1
                 
-                await self.db_manager.update_pair(pair)
+                self._mark_pair_dirty(pair)
                 
-                logger.debug(f"Message copied: {event.id} -> {sent_message.message_id}")
+                logger.debug("Message copied: %s -> %s", ev_id, sent_message_id)
                 return True
             
             return False
             
         except Exception as e:
-            logger.error(f"Error processing new message: {e}")
-            self.stats['errors'] += 1
+            logger.error(f"Error processing new message: {e}", exc_info=self.config.DEBUG_MODE)
+            self.stats.errors += 1
             pair.stats['errors'] = pair.stats.get('errors', 0) + 1
-            await self.db_manager.update_pair(pair)
+            self._mark_pair_dirty(pair)
             return False
     
     async def process_message_edit(self, event, pair: MessagePair, bot: Bot, bot_index: int) -> bool:
         """Process message edit"""
         try:
             # Find original message mapping
-            mapping = await self.db_manager.get_message_mapping(event.id, pair.id)
+            mapping = await self._get_mapping_cached(event.id, pair.id)
             if not mapping:
-                logger.debug(f"No mapping found for edited message {event.id}")
+                logger.debug("No mapping found for edited message %s", event.id)
                 return True  # Not an error if we don't have the original
             
             # Process edited content with entities
@@ -178,6 +706,14 @@ class MessageProcessor:
             if not processed_content:
                 return False
             
+            # Text that was split between a media caption and a follow-up message is edited in both places
+            if mapping.overflow_message_id:
+                if not await self._edit_split_message(bot, pair, mapping, processed_content, processed_entities):
+                    return False
+                pair.stats['edits_synced'] += 1
+                self._mark_pair_dirty(pair)
+                return True
+            
             # Edit the destination message - ensure URLs are handled properly
             try:
                 contains_urls = self._contains_urls(processed_content)
@@ -194,9 +730,9 @@ class MessageProcessor:
                 
                 # Update statistics
                 pair.stats['edits_synced'] += 1
-                await self.db_manager.update_pair(pair)
+                self._mark_pair_dirty(pair)
                 
-                logger.debug(f"Message edited: {mapping.destination_message_id}")
+                logger.debug("Message edited: %s", mapping.destination_message_id)
                 return True
                 
             except BadRequest as e:
@@ -206,7 +742,7 @@ class MessageProcessor:
                 return False
             
         except Exception as e:
-            logger.error(f"Error processing message edit: {e}")
+            logger.error(f"Error processing message edit: {e}", exc_info=self.config.DEBUG_MODE)
             return False
     
     async def process_message_delete(self, event, pair: MessagePair, bot: Bot, bot_index: int) -> bool:
@@ -214,61 +750,85 @@ class MessageProcessor:
         try:
             deleted_count = 0
             
-            # Handle multiple deleted messages
+            # Resolve all deleted IDs at once; cache hits first, then one query for the rest
+            mappings = await self._get_mappings_cached(list(event.deleted_ids), pair.id)
             for message_id in event.deleted_ids:
-                mapping = await self.db_manager.get_message_mapping(message_id, pair.id)
-                if mapping:
-                    try:
-                        await bot.delete_message(
-                            chat_id=pair.destination_chat_id,
-                            message_id=mapping.destination_message_id
-                        )
-                        deleted_count += 1
-                        logger.debug(f"Message deleted: {mapping.destination_message_id}")
-                        
-                    except BadRequest as e:
-                        if "message to delete not found" not in str(e).lower():
-                            logger.warning(f"Failed to delete message: {e}")
+                self._mapping_cache.pop((message_id, pair.id), None)
+            dest_ids = []
+            for mapping in mappings.values():
+                dest_ids.append(mapping.destination_message_id)
+                # Caption text that did not fit went out as a follow-up message; delete it too
+                if mapping.overflow_message_id:
+                    dest_ids.append(mapping.overflow_message_id)
+            
+            # deleteMessages accepts up to 100 IDs per call
+            for start in range(0, len(dest_ids), 100):
+                chunk = dest_ids[start:start + 100]
+                try:
+                    await bot.delete_messages(chat_id=pair.destination_chat_id, message_ids=chunk)
+                    deleted_count += len(chunk)
+                    logger.debug("Messages deleted: %s", chunk)
+                except BadRequest as e:
+                    # Bulk deletion failed as a whole; fall back to per-message deletes in parallel
+                    logger.debug("Bulk delete failed (%s), deleting individually", e)
+                    results = await asyncio.gather(*(
+                        bot.delete_message(chat_id=pair.destination_chat_id, message_id=dest_id)
+                        for dest_id in chunk
+                    ), return_exceptions=True)
+                    for result in results:
+                        if isinstance(result, BaseException):
+                            if not isinstance(result, BadRequest) or "message to delete not found" not in str(result).lower():
+                                logger.warning(f"Failed to delete message: {result}")
+                        else:
+                            deleted_count += 1
             
             # Update statistics
             if deleted_count > 0:
                 pair.stats['deletes_synced'] += deleted_count
-                await self.db_manager.update_pair(pair)
+                self._mark_pair_dirty(pair)
             
             return True
             
         except Exception as e:
-            logger.error(f"Error processing message deletion: {e}")
+            logger.error(f"Error processing message deletion: {e}", exc_info=self.config.DEBUG_MODE)
             return False
     
-    async def _process_message_content(self, event, pair: MessagePair) -> tuple[Optional[str], List]:
+    async def _process_message_content(self, event, pair: MessagePair, text: Optional[str] = None) -> tuple[Optional[str], List]:
         """Process and filter message content with full entity support and formatting preservation"""
-        try:
-            # Use raw_text to preserve original formatting without markdown conversion
+        # Use raw_text to preserve original formatting without markdown conversion
+        if text is None:
             text = event.raw_text or event.text or ""
+        try:
             entities = getattr(event, 'entities', []) or []
             
-            logger.debug(f"Processing message content: {text[:100]}... (entities: {len(entities)})")
-            
-            # Always apply text filters (mention removal, header/footer, etc.) but preserve formatting
-            # First apply all text transformations
-            filtered_text, processed_entities = await self.message_filter.filter_text(text, pair, entities)
+            # Relay-only pairs have nothing to transform; forward the text and entities untouched
+            if pair.filter_cfg.is_passthrough:
+                return text, entities
             
-            # Log text filtering results
-            original_lines = len(text.split('\n'))
-            filtered_lines = len(filtered_text.split('\n'))
-            logger.info(f"Text filtering completed - Lines: {original_lines} → {filtered_lines}, Length: {len(text)} → {len(filtered_text)}")
+            logger.debug("Processing message content: %s... (entities: %d)", text[:100], len(entities))
             
-            if text != filtered_text:
-                logger.info(f"Text was modified by filters")
-                logger.debug(f"Original: {repr(text[:200])}")
-                logger.debug(f"Filtered: {repr(filtered_text[:200])}")
+            # Apply text filters (mention removal, header/footer, etc.) but preserve formatting;
+            # pairs with only length limits skip the transform pass entirely
+            if self.message_filter.has_text_rules(pair):
+                filtered_text, processed_entities = await self.message_filter.filter_text(text, pair, entities)
+                
+                # Log text filtering results
+                original_lines = text.count('\n') + 1
+                filtered_lines = filtered_text.count('\n') + 1
+                logger.info(f"Text filtering completed - Lines: {original_lines} → {filtered_lines}, Length: {len(text)} → {len(filtered_text)}")
+                
+                if text != filtered_text:
+                    logger.info(f"Text was modified by filters")
+                    logger.debug("Original: %r", text[:200])
+                    logger.debug("Filtered: %r", filtered_text[:200])
+                else:
+                    logger.info(f"Text unchanged by filters")
             else:
-                logger.info(f"Text unchanged by filters")
+                filtered_text, processed_entities = text, entities
             
             # Check length limits
-            min_length = pair.filters.get("min_message_length", 0)
-            max_length = pair.filters.get("max_message_length", 0)
+            min_length = pair.filter_cfg.min_message_length
+            max_length = pair.filter_cfg.max_message_length
             
             if min_length > 0 and len(filtered_text) < min_length:
                 return None, []
@@ -286,127 +846,45 @@ class MessageProcessor:
         except Exception as e:
             logger.error(f"Error processing message content: {e}")
             # Return original text as fallback
-            return event.raw_text or event.text or "", []
+            return text, []
     
-    async def _process_media(self, event, pair: MessagePair, bot: Bot) -> Optional[Any]:
-        """Process media content with comprehensive type detection and web page support"""
-        try:
-            media = event.media
-            
-            # Handle web page previews
-            if hasattr(media, '__class__') and 'MessageMediaWebPage' in str(media.__class__):
-                # Extract webpage info
-                webpage = getattr(media, 'webpage', None)
-                if webpage:
-                    return {
-                        'type': 'webpage',
-                        'url': getattr(webpage, 'url', ''),
-                        'title': getattr(webpage, 'title', ''),
-                        'description': getattr(webpage, 'description', ''),
-                        'photo': getattr(webpage, 'photo', None),
-                        'original_media': media
-                    }
-            
-            # Check if media type is allowed
-            allowed_types = pair.filters.get("allowed_media_types", [
-                "photo", "video", "document", "audio", "voice", "animation", "video_note", "sticker", "webpage"
-            ])
-            
-            media_type = self._get_media_type(media)
-            if media_type not in allowed_types:
-                logger.debug(f"Media type {media_type} not allowed")
-                return False  # Media blocked
-            
-            # Special handling for images with enhanced duplicate detection
-            if media_type in ["photo", "animation"] or (isinstance(media, MessageMediaDocument) and media_type == "photo"):
-                if await self.image_handler.is_image_blocked(event, pair):
-                    logger.debug("Image blocked as duplicate")
-                    pair.stats['images_blocked'] = pair.stats.get('images_blocked', 0) + 1
-                    return False
-            
-            # Download media with comprehensive error handling and retries
-            media_data = None
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    media_data = await self._download_media(event)
-                    if media_data:
-                        break
-                except Exception as download_error:
-                    logger.warning(f"Media download attempt {attempt + 1} failed: {download_error}")
-                    if attempt == max_retries - 1:
-                        logger.error(f"All download attempts failed for media type {media_type}")
-                        return None
-            
-            if not media_data:
-                logger.warning("Failed to download media after all attempts")
-                return None
-            
-            # Extract comprehensive media attributes with safe attribute access
-            filename = None
-            duration = None
-            width = None
-            height = None
-            thumb = None
-            
-            if hasattr(media, 'document') and media.document and getattr(media.document, 'attributes', None):
-                document = media.document
-                attributes = getattr(document, 'attributes', [])
-                
-                # Safely extract filename and attributes from document
-                for attr in attributes:
-                    attr_type = type(attr).__name__
-                    # Extract filename from DocumentAttributeFilename
-                    if attr_type == 'DocumentAttributeFilename':
-                        filename = getattr(attr, 'file_name', None)
-                    # Extract duration from DocumentAttributeVideo or DocumentAttributeAudio
-                    elif attr_type in ['DocumentAttributeVideo', 'DocumentAttributeAudio']:
-                        duration = getattr(attr, 'duration', None)
-                    # Extract dimensions from DocumentAttributeVideo or DocumentAttributeImageSize
-                    elif attr_type in ['DocumentAttributeVideo', 'DocumentAttributeImageSize']:
-                        width = getattr(attr, 'w', None)
-                        height = getattr(attr, 'h', None)
-                
-                # Extract thumbnail safely
-                if hasattr(document, 'thumbs') and getattr(document, 'thumbs', None):
-                    thumbs = getattr(document, 'thumbs', [])
-                    thumb = thumbs[0] if thumbs else None
-            
-            elif hasattr(event.media, 'photo') and getattr(event.media, 'photo', None):
-                # Handle photo attributes
-                photo = event.media.photo
-                if hasattr(photo, 'sizes') and photo.sizes:
-                    largest_size = max(photo.sizes, key=lambda s: getattr(s, 'w', 0) * getattr(s, 'h', 0))
-                    width = getattr(largest_size, 'w', None)
-                    height = getattr(largest_size, 'h', None)
-            
-            # Get MIME type safely
-            mime_type = None
-            if hasattr(media, 'document') and media.document:
-                mime_type = getattr(media.document, 'mime_type', None)
-            
-            return {
-                'type': media_type,
-                'data': media_data,
-                'filename': filename,
-                'duration': duration,
-                'width': width,
-                'height': height,
-                'thumbnail': thumb,
-                'caption': event.raw_text or event.text or "",  # Use raw_text to preserve formatting
-                'original_media': media,
-                'mime_type': mime_type
-            }
-            
-        except Exception as e:
-            logger.error(f"Error processing media: {e}")
-            return None
+    async def _fetch_media(self, event, pair: MessagePair, bot: Bot, text: str) -> Tuple[Optional[Dict], bool]:
+        """Check image blocking, then download the media; returns (media info, image blocked)"""
+        # Check image blocking before processing
+        if await self.is_blocked_image(event, pair):
+            return None, True
+        async with self._download_semaphore:
+            return await self._download_and_prepare_media(event, pair, bot, text), False
     
-    async def _download_and_prepare_media(self, event, pair: MessagePair, bot: Bot) -> Optional[Dict]:
+    @staticmethod
+    async def _download_event_media(event, file):
+        """Download an event's media to a path or to bytes; documents use the largest MTProto part size"""
+        media = event.media
+        document = getattr(media, 'document', None) if isinstance(media, MessageMediaDocument) else None
+        if document is not None and getattr(document, 'size', None):
+            # 512 KB parts need a quarter of the MTProto requests of Telethon's 128 KB default
+            data = await event.client.download_file(
+                document, None if file is bytes else file,
+                part_size_kb=_DOWNLOAD_PART_SIZE_KB, file_size=document.size
+            )
+            return file if isinstance(file, str) else data
+        return await event.download_media(file=file)
+    
+    @staticmethod
+    def _discard_media_task(task: asyncio.Task):
+        """Cancel a media fetch that is no longer needed and remove any file it already produced"""
+        def cleanup(done: asyncio.Task):
+            if done.cancelled() or done.exception():
+                return
+            media_info, _ = done.result()
+            if media_info and media_info.get('cleanup_required') and media_info.get('file_path'):
+                with suppress(OSError):
+                    os.unlink(media_info['file_path'])
+        task.cancel()
+        task.add_done_callback(cleanup)
+    
+    async def _download_and_prepare_media(self, event, pair: MessagePair, bot: Bot, text: str = "") -> Optional[Dict]:
         """Download media via Telethon and prepare for Bot API sending"""
-        import time
-        start_time = time.time()
-        
         try:
             # Get media type and MIME type for logging
             media_type = self._get_message_type(event)
@@ -419,24 +897,63 @@ class MessageProcessor:
             if media_type == "text":
                 return None
             
+            # Web page previews carry no file; the text send path re-creates the preview
+            if media_type == "webpage":
+                webpage = getattr(event.media, 'webpage', None)
+                return {
+                    'type': 'webpage',
+                    'url': getattr(webpage, 'url', ''),
+                    'title': getattr(webpage, 'title', ''),
+                    'description': getattr(webpage, 'description', ''),
+                    'caption': text
+                }
+            
+            # Small media that won't be watermarked stays in memory, skipping the temp-file write and re-read
+            expected_size = event.file.size if event.file else None
+            watermarking = pair.filter_cfg.watermark_enabled and pair.filter_cfg.watermark_text
+            if expected_size and expected_size <= self.config.MEDIA_SPOOL_THRESHOLD and not watermarking:
+                download_start = time.time()
+                data = await self._download_event_media(event, bytes)
+                if not data:
+                    logger.error(f"[MEDIA_DEBUG] Download failed - no data returned, Pair: {pair.id}")
+                    return None
+                logger.info(f"[MEDIA_DEBUG] Download completed in memory - Size: {len(data)} bytes, Time: {time.time() - download_start:.2f}s, Pair: {pair.id}")
+                filename, duration, width, height, _, _ = self._extract_media_attrs(event.media)
+                return {
+                    'type': media_type,
+                    'data': data,
+                    'file_path': None,
+                    'filename': filename or f"{media_type}{event.file.ext or ''}",
+                    'duration': duration,
+                    'width': width,
+                    'height': height,
+                    'caption': text,
+                    'cleanup_required': False
+                }
+            
             # Create a temporary file for download
             temp_file = None
             download_start = time.time()
             try:
-                # Download media to temporary file
-                temp_file = await event.download_media(file=tempfile.mktemp())
+                # Download media to a securely created temporary file, keeping the extension
+                fd, temp_file = tempfile.mkstemp(suffix=event.file.ext if event.file else '')
+                os.close(fd)
+                downloaded = await self._download_event_media(event, temp_file)
                 download_time = time.time() - download_start
                 
-                if not temp_file or not os.path.exists(temp_file):
+                if not downloaded or not os.path.exists(downloaded):
                     logger.error(f"[MEDIA_DEBUG] Download failed - no file created, Pair: {pair.id}")
+                    with suppress(OSError):
+                        os.unlink(temp_file)
                     return None
+                temp_file = downloaded
                 
                 file_size = os.path.getsize(temp_file) if os.path.exists(temp_file) else 0
                 logger.info(f"[MEDIA_DEBUG] Download completed - File: {temp_file}, Size: {file_size} bytes, Time: {download_time:.2f}s, Pair: {pair.id}")
                 
                 # Check if watermarking is enabled for this pair and if this is an image
-                watermark_enabled = pair.filters.get("watermark_enabled", False)
-                watermark_text = pair.filters.get("watermark_text", "")
+                watermark_enabled = pair.filter_cfg.watermark_enabled
+                watermark_text = pair.filter_cfg.watermark_text
                 
                 logger.info(f"[MEDIA_DEBUG] Watermark check - Enabled: {watermark_enabled}, Text: '{watermark_text}', Type: {media_type}, Pair: {pair.id}")
                 
@@ -452,7 +969,7 @@ class MessageProcessor:
                     if is_image:
                         # Apply watermark
                         watermark_start = time.time()
-                        watermarked_file = temp_file.replace(os.path.splitext(temp_file)[1], "_watermarked.jpg")
+                        watermarked_file = os.path.splitext(temp_file)[0] + "_watermarked.jpg"
                         
                         logger.info(f"[MEDIA_DEBUG] Starting watermark - Input: {temp_file}, Output: {watermarked_file}, Text: '{watermark_text}', Pair: {pair.id}")
                         
@@ -474,10 +991,8 @@ class MessageProcessor:
                                     temp_file = watermarked_file
                                 else:
                                     logger.error(f"[MEDIA_DEBUG] Watermarked file is empty - Size: 0 bytes, Pair: {pair.id}")
-                                    try:
+                                    with suppress(OSError):
                                         os.unlink(watermarked_file)
-                                    except:
-                                        pass
                             else:
                                 logger.error(f"[MEDIA_DEBUG] Watermarked file not created - Path: {watermarked_file}, Pair: {pair.id}")
                         else:
@@ -489,30 +1004,7 @@ class MessageProcessor:
                 
                 # Extract media attributes safely
                 logger.info(f"[MEDIA_DEBUG] Extracting attributes - Type: {media_type}, File: {temp_file}, Pair: {getattr(pair, 'id', 'unknown')}")
-                filename = None
-                duration = None
-                width = None
-                height = None
-                
-                if hasattr(event.media, 'document') and event.media.document:
-                    document = event.media.document
-                    if getattr(document, 'attributes', None):
-                        for attr in document.attributes:
-                            attr_type = type(attr).__name__
-                            if attr_type == 'DocumentAttributeFilename':
-                                filename = getattr(attr, 'file_name', None)
-                            elif attr_type in ['DocumentAttributeVideo', 'DocumentAttributeAudio']:
-                                duration = getattr(attr, 'duration', None)
-                            elif attr_type in ['DocumentAttributeVideo', 'DocumentAttributeImageSize']:
-                                width = getattr(attr, 'w', None)
-                                height = getattr(attr, 'h', None)
-                
-                elif hasattr(event.media, 'photo') and event.media.photo:
-                    photo = event.media.photo
-                    if hasattr(photo, 'sizes') and photo.sizes:
-                        largest_size = max(photo.sizes, key=lambda s: getattr(s, 'w', 0) * getattr(s, 'h', 0))
-                        width = getattr(largest_size, 'w', None)
-                        height = getattr(largest_size, 'h', None)
+                filename, duration, width, height, _, _ = self._extract_media_attrs(event.media)
                 
                 # Prepare media for Bot API with file cleanup
                 try:
@@ -531,233 +1023,197 @@ class MessageProcessor:
                     'duration': duration,
                     'width': width,
                     'height': height,
-                    'caption': event.raw_text or event.text or "",
+                    'caption': text,
                     'cleanup_required': True
                 }
                 
+            except asyncio.CancelledError:
+                # The message was abandoned mid-download; don't leave the partial file behind
+                if temp_file:
+                    with suppress(OSError):
+                        os.unlink(temp_file)
+                raise
             except Exception as download_error:
                 # Clean up on error
-                if temp_file and os.path.exists(temp_file):
-                    try:
+                if temp_file:
+                    with suppress(OSError):
                         os.unlink(temp_file)
-                    except:
-                        pass
-                import traceback
                 pair_id = getattr(pair, 'id', 'unknown')
                 logger.error(f"[MEDIA_DEBUG] Error during media download/processing - Pair: {pair_id}, Type: {media_type}, Error: {download_error}")
-                logger.error(f"[MEDIA_DEBUG] Full traceback: {traceback.format_exc()}")
+                if self.config.DEBUG_MODE:
+                    logger.error(f"[MEDIA_DEBUG] Full traceback: {traceback.format_exc()}")
                 return None
                 
         except Exception as e:
-            import traceback
             pair_id = getattr(pair, 'id', 'unknown')
             logger.error(f"[MEDIA_DEBUG] Error preparing media - Pair: {pair_id}, Error: {e}")
-            logger.error(f"[MEDIA_DEBUG] Full traceback: {traceback.format_exc()}")
+            if self.config.DEBUG_MODE:
+                logger.error(f"[MEDIA_DEBUG] Full traceback: {traceback.format_exc()}")
             return None
             
-    async def _download_media(self, event) -> Optional[BytesIO]:
-        """Download media from message"""
-        try:
-            # Create a BytesIO buffer
-            buffer = BytesIO()
-            
-            # Download media to buffer
-            await event.client.download_media(event.media, file=buffer)
-            buffer.seek(0)
-            
-            return buffer
-            
-        except Exception as e:
-            logger.error(f"Error downloading media: {e}")
-            return None
+    def _extract_media_attrs(self, media) -> Tuple[Optional[str], Optional[int], Optional[int], Optional[int], Any, Optional[str]]:
+        """Extract (filename, duration, width, height, thumb, mime_type) from Telethon media"""
+        filename = duration = width = height = thumb = mime_type = None
+        
+        document = getattr(media, 'document', None)
+        if document:
+            for attr in document.attributes or ():
+                if isinstance(attr, DocumentAttributeFilename):
+                    filename = attr.file_name
+                elif isinstance(attr, DocumentAttributeVideo):
+                    duration, width, height = attr.duration, attr.w, attr.h
+                elif isinstance(attr, DocumentAttributeAudio):
+                    duration = attr.duration
+                elif isinstance(attr, DocumentAttributeImageSize):
+                    width, height = attr.w, attr.h
+            if document.thumbs:
+                thumb = document.thumbs[0]
+            mime_type = document.mime_type
+        else:
+            photo = getattr(media, 'photo', None)
+            if photo and getattr(photo, 'sizes', None):
+                largest_size = max(photo.sizes, key=lambda s: getattr(s, 'w', 0) * getattr(s, 'h', 0))
+                width = getattr(largest_size, 'w', None)
+                height = getattr(largest_size, 'h', None)
+        
+        return filename, duration, width, height, thumb, mime_type
     
-
-
     async def _send_message(self, bot: Bot, chat_id: int, content: str, 
                           media_info: Optional[Dict], reply_to_message_id: Optional[int] = None,
-                          entities: Optional[List] = None):
-        """Send message to destination chat with comprehensive media and formatting support"""
-        import time
+                          entities: Optional[List] = None, contains_urls: Optional[bool] = None) -> Optional[int]:
+        """Send message to destination chat with comprehensive media and formatting support; returns the new message ID"""
         send_start = time.time()
+        open_files = []
         
         try:
+            await self._wait_for_send_slot(chat_id)
+            
             logger.info(f"[SEND_DEBUG] Starting message send - Chat: {chat_id}, Content length: {len(content) if content else 0}, Media: {media_info['type'] if media_info else None}")
             
-            # Validate and convert entities for proper formatting and premium emoji support  
-            converted_entities = self._validate_and_convert_entities(content, entities or [])
+            is_media = bool(media_info) and media_info.get('type') != 'webpage'
+            
+            # Validate and convert entities for proper formatting and premium emoji support.
+            # Media only needs them against the caption, so convert once for whichever text is sent.
+            if is_media:
+                caption = content[:1024] if content else None
+                # Measured once: bounds the caption entities and offsets any overflow text sent after the media
+                caption_utf16 = _utf16_len(caption) if caption else 0
+                converted_entities = await self._validate_and_convert_entities_async(caption, entities or [], caption_utf16) if caption else []
+            else:
+                converted_entities = await self._validate_and_convert_entities_async(content, entities or [])
             
             # Handle webpage preview messages
             if media_info and media_info.get('type') == 'webpage':
                 # For webpage previews, send as text with web preview enabled
                 if content:
-                    return await bot.send_message(
+                    sent = await bot.send_message(
                         chat_id=chat_id,
                         text=content,
                         entities=converted_entities,
                         disable_web_page_preview=False,  # Enable webpage previews
                         reply_to_message_id=reply_to_message_id
                     )
+                    return sent.message_id
                 else:
                     # If no content but has webpage info, send the URL to trigger preview
                     webpage_url = media_info.get('url', '')
                     if webpage_url:
-                        return await bot.send_message(
+                        sent = await bot.send_message(
                             chat_id=chat_id,
                             text=webpage_url,
                             disable_web_page_preview=False,
                             reply_to_message_id=reply_to_message_id
                         )
+                        return sent.message_id
             
-            if media_info and media_info.get('type') != 'webpage':
+            if is_media:
                 # Send media message with downloaded file
-                caption = content[:1024] if content else None
-                caption_entities = self._validate_and_convert_entities(caption, entities) if caption and entities else None
+                caption_entities = converted_entities or None
                 
                 media_type = media_info['type']
                 file_path = media_info.get('file_path')
-                file_size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
+                media_data = media_info.get('data')
+                if media_data is not None:
+                    file_size = len(media_data)
+                else:
+                    file_size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
                 
-                logger.info(f"[SEND_DEBUG] Media send prep - Type: {media_type}, File: {file_path}, Size: {file_size} bytes")
+                logger.info(f"[SEND_DEBUG] Media send prep - Type: {media_type}, File: {file_path or 'memory'}, Size: {file_size} bytes")
                 
-                if not file_path or not os.path.exists(file_path):
+                if media_data is None and (not file_path or not os.path.exists(file_path)):
                     logger.error(f"[SEND_DEBUG] Media file missing - Path: {file_path}, Exists: {os.path.exists(file_path) if file_path else False}")
                     return None
                 
                 if file_size == 0:
-                    logger.error(f"[SEND_DEBUG] Media file is empty - Path: {file_path}")
+                    logger.error(f"[SEND_DEBUG] Media file is empty - Path: {file_path or 'memory'}")
                     return None
                 
-                try:
-                    # Send based on media type with all attributes preserved
-                    if media_type == 'photo':
-                        logger.info(f"[SEND_DEBUG] Sending photo - Size: {file_size} bytes, Caption: {len(caption) if caption else 0} chars")
-                        try:
-                            with open(file_path, 'rb') as photo_file:
-                                result = await bot.send_photo(
-                                    chat_id=chat_id,
-                                    photo=photo_file,
-                                    caption=caption,
-                                    caption_entities=caption_entities,
-                                    reply_to_message_id=reply_to_message_id
-                                )
-                                send_time = time.time() - send_start
-                                logger.info(f"[SEND_DEBUG] Photo sent successfully - Message ID: {result.message_id}, Time: {send_time:.2f}s")
-                        except Exception as photo_error:
-                            logger.error(f"[SEND_DEBUG] Photo send failed: {photo_error}")
-                            raise photo_error
-                    elif media_type == 'video':
-                        logger.info(f"[SEND_DEBUG] Sending video - Size: {file_size} bytes, Duration: {media_info.get('duration')}")
-                        try:
-                            with open(file_path, 'rb') as video_file:
-                                result = await bot.send_video(
-                                    chat_id=chat_id,
-                                    video=video_file,
-                                    caption=caption,
-                                    caption_entities=caption_entities,
-                                    duration=media_info.get('duration'),
-                                    width=media_info.get('width'),
-                                    height=media_info.get('height'),
-                                    reply_to_message_id=reply_to_message_id
-                                )
-                                send_time = time.time() - send_start
-                                logger.info(f"[SEND_DEBUG] Video sent successfully - Message ID: {result.message_id}, Time: {send_time:.2f}s")
-                        except Exception as video_error:
-                            logger.error(f"[SEND_DEBUG] Video send failed: {video_error}")
-                            raise video_error
-                    elif media_type == 'animation':
-                        with open(file_path, 'rb') as animation_file:
-                            result = await bot.send_animation(
-                                chat_id=chat_id,
-                                animation=animation_file,
-                                caption=caption,
-                                caption_entities=caption_entities,
-                                duration=media_info.get('duration'),
-                                width=media_info.get('width'),
-                                height=media_info.get('height'),
-                                reply_to_message_id=reply_to_message_id
-                            )
-                    elif media_type == 'document':
-                        with open(file_path, 'rb') as document_file:
-                            result = await bot.send_document(
-                                chat_id=chat_id,
-                                document=document_file,
-                                filename=media_info.get('filename'),
-                                caption=caption,
-                                caption_entities=caption_entities,
-                                reply_to_message_id=reply_to_message_id
-                            )
-                    elif media_type == 'audio':
-                        with open(file_path, 'rb') as audio_file:
-                            result = await bot.send_audio(
-                                chat_id=chat_id,
-                                audio=audio_file,
-                                caption=caption,
-                                caption_entities=caption_entities,
-                                duration=media_info.get('duration'),
-                                reply_to_message_id=reply_to_message_id
-                            )
-                    elif media_type == 'voice':
-                        with open(file_path, 'rb') as voice_file:
-                            result = await bot.send_voice(
-                                chat_id=chat_id,
-                                voice=voice_file,
-                                caption=caption,
-                                caption_entities=caption_entities,
-                                duration=media_info.get('duration'),
-                                reply_to_message_id=reply_to_message_id
-                            )
-                    elif media_type == 'video_note':
-                        with open(file_path, 'rb') as video_note_file:
-                            result = await bot.send_video_note(
-                                chat_id=chat_id,
-                                video_note=video_note_file,
-                                duration=media_info.get('duration'),
-                                length=media_info.get('width', 240),  # Video notes are square
-                                reply_to_message_id=reply_to_message_id
-                            )
-                    elif media_type == 'sticker':
-                        with open(file_path, 'rb') as sticker_file:
-                            result = await bot.send_sticker(
-                                chat_id=chat_id,
-                                sticker=sticker_file,
-                                reply_to_message_id=reply_to_message_id
-                            )
-                    else:
-                        result = None
-                    
-                    # Clean up downloaded file
-                    if media_info.get('cleanup_required') and file_path and os.path.exists(file_path):
-                        try:
-                            os.unlink(file_path)
-                        except Exception as cleanup_error:
-                            logger.warning(f"Failed to cleanup temp file {file_path}: {cleanup_error}")
+                # Send based on media type with all attributes preserved
+                sender = self._MEDIA_SENDERS.get(media_type)
+                if sender:
+                    method_name, endpoint, arg_name, extras = sender
+                    logger.info(f"[SEND_DEBUG] Sending {media_type} - Size: {file_size} bytes, Caption: {len(caption) if caption else 0} chars")
+                    kwargs = {'chat_id': chat_id}
+                    if media_type not in self._CAPTIONLESS_MEDIA:
+                        kwargs['caption'] = caption
+                        kwargs['caption_entities'] = caption_entities
+                    for kwarg, info_key in extras:
+                        kwargs[kwarg] = media_info.get(info_key)
+                    filename = kwargs.pop('filename', None) or self._upload_filename(media_info)
+                    kwargs[arg_name] = self._media_input_file(media_info, filename, open_files)
                     
-                    return result
+                    if self.config.USE_RAW_BOT_API:
+                        if reply_to_message_id:
+                            kwargs['reply_parameters'] = {'message_id': reply_to_message_id}
+                        result = await self._raw_send(bot, endpoint, kwargs)
+                    else:
+                        kwargs['reply_to_message_id'] = reply_to_message_id
+                        result = (await getattr(bot, method_name)(**kwargs)).message_id
+                    send_time = time.time() - send_start
+                    logger.info(f"[SEND_DEBUG] {media_type} sent successfully - Message ID: {result}, Time: {send_time:.2f}s")
                     
-                except Exception as send_error:
-                    # Clean up on error
-                    if media_info.get('cleanup_required') and file_path and os.path.exists(file_path):
-                        try:
-                            os.unlink(file_path)
-                        except:
-                            pass
-                    raise send_error
+                    # Text that did not fit in the caption follows as a separate message instead of being dropped
+                    if result and content:
+                        overflow_id = None
+                        if media_type in self._CAPTIONLESS_MEDIA:
+                            overflow_id = await self._send_caption_overflow(bot, chat_id, content, entities or [], 0, 0)
+                        elif len(content) > len(caption):
+                            overflow_id = await self._send_caption_overflow(bot, chat_id, content, entities or [], len(caption), caption_utf16)
+                        if overflow_id:
+                            self._caption_overflow_ids[(chat_id, result)] = overflow_id
+                else:
+                    result = None
+                
+                return result
 
             else:
                 # Send text message with enhanced formatting support and URL preview handling
                 if content:
-                    contains_urls = self._contains_urls(content)
-                    logger.info(f"Sending text message. Contains URLs: {contains_urls}, Content: {content[:200]}...")
+                    # The caller usually already scanned for URLs; only scan here if it didn't
+                    if contains_urls is None:
+                        contains_urls = self._contains_urls(content)
                     
                     # For messages with URLs, ensure webpage preview is enabled
                     # disable_web_page_preview=False means preview is ENABLED
                     # disable_web_page_preview=True means preview is DISABLED
                     disable_preview = not contains_urls  # False if URLs present (preview enabled), True if no URLs (preview disabled)
                     
-                    logger.info(f"Setting disable_web_page_preview={disable_preview} for message with URLs={contains_urls}")
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info(f"Sending text message with disable_web_page_preview={disable_preview}, Content: {content[:200]}...")
                     
                     # Send as text message (never as media) to ensure formatting is preserved and URLs work properly
-                    return await bot.send_message(
+                    if self.config.USE_RAW_BOT_API:
+                        data = {
+                            'chat_id': chat_id,
+                            'text': content,
+                            'entities': converted_entities or None,
+                            'link_preview_options': {'is_disabled': disable_preview}
+                        }
+                        if reply_to_message_id:
+                            data['reply_parameters'] = {'message_id': reply_to_message_id}
+                        return await self._raw_send(bot, 'sendMessage', data)
+                    
+                    sent = await bot.send_message(
                         chat_id=chat_id,
                         text=content,
                         entities=converted_entities,
@@ -765,6 +1221,7 @@ class MessageProcessor:
                         reply_to_message_id=reply_to_message_id,
                         parse_mode=None  # Use entities instead of parse_mode to preserve original formatting
                     )
+                    return sent.message_id
             
             return None
             
@@ -789,106 +1246,279 @@ class MessageProcessor:
             logger.warning(f"Bad request sending message, trying fallback: {e}")
             # Comprehensive fallback strategy
             try:
+                sent = None
                 if media_info and media_info.get('type') != 'webpage':
                     caption = content[:1024] if content else None
                     media_type = media_info['type']
+                    file_path = media_info.get('file_path')
+                    sender = self._MEDIA_SENDERS.get(media_type)
                     
-                    # Try basic media sending without advanced attributes
-                    if media_type == 'photo':
-                        return await bot.send_photo(chat_id=chat_id, photo=media_info['data'], caption=caption, reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'video':
-                        return await bot.send_video(chat_id=chat_id, video=media_info['data'], caption=caption, reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'animation':
-                        return await bot.send_animation(chat_id=chat_id, animation=media_info['data'], caption=caption, reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'document':
-                        return await bot.send_document(chat_id=chat_id, document=media_info['data'], caption=caption, reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'audio':
-                        return await bot.send_audio(chat_id=chat_id, audio=media_info['data'], caption=caption, reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'voice':
-                        return await bot.send_voice(chat_id=chat_id, voice=media_info['data'], reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'video_note':
-                        return await bot.send_video_note(chat_id=chat_id, video_note=media_info['data'], reply_to_message_id=reply_to_message_id)
-                    elif media_type == 'sticker':
-                        return await bot.send_sticker(chat_id=chat_id, sticker=media_info['data'], reply_to_message_id=reply_to_message_id)
+                    # Try basic media sending without advanced attributes, reusing the primary dispatch table
+                    if sender and (media_info.get('data') is not None or (file_path and os.path.exists(file_path))):
+                        method_name, _, arg_name, _ = sender
+                        kwargs = {
+                            'chat_id': chat_id,
+                            arg_name: self._media_input_file(media_info, self._upload_filename(media_info), open_files),
+                            'reply_to_message_id': reply_to_message_id
+                        }
+                        if media_type not in self._CAPTIONLESS_MEDIA:
+                            kwargs['caption'] = caption
+                        sent = await getattr(bot, method_name)(**kwargs)
                 else:
                     # Final fallback: plain text without entities, check for URLs
-                    contains_urls = self._contains_urls(content)
+                    if contains_urls is None:
+                        contains_urls = self._contains_urls(content)
                     disable_preview = not contains_urls
                     logger.info(f"Fallback: Setting disable_web_page_preview={disable_preview} for URLs={contains_urls}")
                     
                     # Ensure fallback also sends as text message with URL preview capability
-                    return await bot.send_message(
+                    sent = await bot.send_message(
                         chat_id=chat_id, 
                         text=content, 
                         reply_to_message_id=reply_to_message_id, 
                         disable_web_page_preview=disable_preview,
                         parse_mode=None  # No parse mode to avoid formatting conflicts
                     )
+                return sent.message_id if sent else None
             except Exception as fallback_error:
                 logger.error(f"All fallback attempts failed: {fallback_error}")
                 return None
         except Exception as e:
             logger.error(f"Error sending message: {e}")
             return None
+        finally:
+            for handle in open_files:
+                handle.close()
+            # Clean up downloaded file
+            self._cleanup_media_file(media_info)
+    
+    @staticmethod
+    def _cleanup_media_file(media_info: Optional[Dict]):
+        """Remove a downloaded temp file once it has been sent"""
+        if media_info and media_info.get('cleanup_required') and media_info.get('file_path'):
+            try:
+                os.unlink(media_info['file_path'])
+            except FileNotFoundError:
+                pass
+            except OSError as cleanup_error:
+                logger.warning(f"Failed to cleanup temp file {media_info['file_path']}: {cleanup_error}")
+    
+    async def _send_album(self, items: List[AlbumItem]) -> List[Optional[int]]:
+        """Send buffered album items as media groups; returns the message IDs in item order"""
+        results: List[Optional[int]] = [None] * len(items)
+        order = sorted(range(len(items)), key=lambda i: items[i].source_message_id)
+        families: Dict[str, List[int]] = {}
+        for i in order:
+            families.setdefault(_ALBUM_FAMILIES[items[i].media_info['type']], []).append(i)
+        
+        chat_id = items[0].chat_id
+        for indices in families.values():
+            for start in range(0, len(indices), _MEDIA_GROUP_MAX_ITEMS):
+                chunk = indices[start:start + _MEDIA_GROUP_MAX_ITEMS]
+                message_ids = await self._get_chat_worker(chat_id).submit(
+                    lambda chunk=chunk: self._send_media_group([items[i] for i in chunk])
+                )
+                for i, message_id in zip(chunk, message_ids):
+                    results[i] = message_id
+        return results
+    
+    async def _send_media_group(self, items: List[AlbumItem]) -> List[Optional[int]]:
+        """Send up to ten compatible album items in one sendMediaGroup call, falling back to single sends"""
+        first = items[0]
+        if len(items) == 1:
+            return [await self._send_message(first.bot, first.chat_id, first.content, first.media_info,
+                                             first.reply_to_message_id, first.entities, False)]
+        
+        open_files = []
+        try:
+            await self._wait_for_send_slot(first.chat_id)
+            media = []
+            for item in items:
+                caption = item.content[:1024] if item.content else None
+                caption_entities = await self._validate_and_convert_entities_async(caption, item.entities) if caption else None
+                media_class, extras = _ALBUM_INPUT_MEDIA[item.media_info['type']]
+                if item.media_info.get('data') is not None:
+                    payload = item.media_info['data']
+                else:
+                    payload = open(item.media_info['file_path'], 'rb')
+                    open_files.append(payload)
+                media.append(media_class(
+                    media=payload,
+                    caption=caption,
+                    caption_entities=caption_entities or None,
+                    filename=self._upload_filename(item.media_info),
+                    **{kwarg: item.media_info.get(info_key) for kwarg, info_key in extras}
+                ))
+            
+            messages = await first.bot.send_media_group(
+                chat_id=first.chat_id,
+                media=media,
+                reply_to_message_id=first.reply_to_message_id
+            )
+            logger.info(f"[SEND_DEBUG] Media group of {len(items)} sent to chat {first.chat_id}")
+        except Exception as e:
+            logger.warning(f"Media group send to chat {first.chat_id} failed, sending items individually: {e}")
+            for handle in open_files:
+                handle.close()
+            open_files = []
+            return [
+                await self._send_message(item.bot, item.chat_id, item.content, item.media_info,
+                                         item.reply_to_message_id, item.entities, False)
+                for item in items
+            ]
+        finally:
+            for handle in open_files:
+                handle.close()
+        
+        for item in items:
+            self._cleanup_media_file(item.media_info)
+        # Captions beyond the limit follow the album instead of being dropped
+        for item, message in zip(items, messages):
+            if len(item.content) > 1024:
+                overflow_id = await self._send_caption_overflow(item.bot, item.chat_id, item.content, item.entities,
+                                                                1024, _utf16_len(item.content[:1024]))
+                if overflow_id:
+                    self._caption_overflow_ids[(item.chat_id, message.message_id)] = overflow_id
+        return [message.message_id for message in messages]
 
-    def _validate_and_convert_entities(self, text: str, entities: List) -> List:
+    async def _wait_for_send_slot(self, chat_id: int):
+        """Delay until chat_id is under RATE_LIMIT_MESSAGES sends per RATE_LIMIT_WINDOW seconds, when enabled"""
+        if not self.config.RATE_LIMIT_ENABLED:
+            return
+        limit = self.config.RATE_LIMIT_MESSAGES
+        if limit <= 0:
+            return
+        slots = self._chat_send_slots.get(chat_id)
+        if slots is None:
+            slots = self._chat_send_slots[chat_id] = deque(maxlen=limit)
+        
+        # Reserve the slot before sleeping so concurrent sends to the same chat queue up behind it
+        now = time.monotonic()
+        slot = now if len(slots) < limit else max(now, slots[0] + self.config.RATE_LIMIT_WINDOW)
+        slots.append(slot)
+        if slot > now:
+            logger.debug("Rate limit reached for chat %s, delaying send by %.2fs", chat_id, slot - now)
+            await asyncio.sleep(slot - now)
+    
+    @staticmethod
+    def _media_input_file(media_info: Dict, filename: Optional[str], open_files: List) -> InputFile:
+        """Upload payload: in-memory bytes for small media, otherwise the temp file streamed from disk"""
+        if media_info.get('data') is not None:
+            return InputFile(media_info['data'], filename=filename)
+        # The HTTP client reads the handle in chunks while uploading, so large media is never held in memory whole
+        handle = open(media_info['file_path'], 'rb')
+        open_files.append(handle)
+        return InputFile(handle, filename=filename, read_file_handle=False)
+    
+    @staticmethod
+    def _upload_filename(media_info: Dict) -> Optional[str]:
+        """Filename to attach to an upload"""
+        if media_info.get('file_path'):
+            return os.path.basename(media_info['file_path'])
+        return media_info.get('filename')
+    
+    async def _send_caption_overflow(self, bot: Bot, chat_id: int, content: str, entities: List,
+                                     start: int, start_utf16: int) -> Optional[int]:
+        """Send the text beyond a media caption (start chars, start_utf16 UTF-16 units) as a follow-up message, keeping its formatting"""
+        rest = content[start:]
+        if not rest.strip():
+            return None
+        try:
+            # The follow-up is a send of its own and counts against the chat's rate limit
+            await self._wait_for_send_slot(chat_id)
+            rest_entities = self._validate_and_convert_entities(rest, entities, start_utf16)
+            if self.config.USE_RAW_BOT_API:
+                return await self._raw_send(bot, 'sendMessage', {
+                    'chat_id': chat_id,
+                    'text': rest,
+                    'entities': rest_entities or None,
+                    'link_preview_options': {'is_disabled': True}
+                })
+            sent = await bot.send_message(
+                chat_id=chat_id,
+                text=rest,
+                entities=rest_entities or None,
+                disable_web_page_preview=True,
+                parse_mode=None
+            )
+            return sent.message_id
+        except Exception as e:
+            logger.warning(f"Failed to send caption overflow to chat {chat_id}: {e}")
+            return None
+    
+    async def _edit_split_message(self, bot: Bot, pair: MessagePair, mapping: MessageMapping,
+                                  content: str, entities: List) -> bool:
+        """Edit a media message whose text was split into its caption and a follow-up message"""
+        chat_id = pair.destination_chat_id
+        start = 0 if mapping.message_type in self._CAPTIONLESS_MEDIA else 1024
+        caption, rest = content[:start], content[start:]
+        caption_utf16 = _utf16_len(caption)
+        edits = []
+        if caption:
+            caption_entities = await self._validate_and_convert_entities_async(caption, entities, caption_utf16)
+            edits.append(bot.edit_message_caption(
+                chat_id=chat_id,
+                message_id=mapping.destination_message_id,
+                caption=caption,
+                caption_entities=caption_entities or None,
+                parse_mode=None
+            ))
+        if rest.strip():
+            rest_entities = self._validate_and_convert_entities(rest, entities, caption_utf16)
+            edits.append(bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=mapping.overflow_message_id,
+                text=rest,
+                entities=rest_entities or None,
+                disable_web_page_preview=True,
+                parse_mode=None
+            ))
+        else:
+            # The edited text fits in the caption now, so the follow-up message is no longer needed
+            edits.append(bot.delete_message(chat_id=chat_id, message_id=mapping.overflow_message_id))
+            mapping.overflow_message_id = None
+            self._pending_mappings.append(mapping)
+        
+        success = True
+        for result in await asyncio.gather(*edits, return_exceptions=True):
+            if isinstance(result, BaseException):
+                if isinstance(result, BadRequest) and "message is not modified" in str(result).lower():
+                    continue  # Content unchanged, not an error
+                logger.warning(f"Failed to edit split message {mapping.destination_message_id}: {result}")
+                success = False
+        return success
+    
+    async def _raw_send(self, bot: Bot, endpoint: str, data: Dict[str, Any]) -> Optional[int]:
+        """Call a Bot API send method directly and return only the new message ID"""
+        # Bot._post skips building Message/User/Chat objects we would throw away
+        result = await bot._post(endpoint, data)
+        if isinstance(result, dict):
+            return result.get('message_id')
+        return None
+    
+    def _validate_and_convert_entities(self, text: str, entities: List, shift: int = 0,
+                                       text_length: Optional[int] = None) -> List:
         """Validate entities against text and convert them with comprehensive bounds checking"""
         if not text or not entities:
             return []
         
         try:
-            # Calculate text length in UTF-16 units (Telegram's standard)
-            text_bytes = text.encode('utf-16-le')
-            text_length = len(text_bytes) // 2
+            # Text length in UTF-16 units (Telegram's standard), unless the caller already has it; bounds are checked during conversion
+            if text_length is None:
+                text_length = _utf16_len(text)
+            return self._convert_entities_for_telegram(entities, text_length, shift)
             
-            # Convert entities first
-            converted_entities = self._convert_entities_for_telegram(entities)
-            
-            # Validate and adjust entities with bounds checking
-            valid_entities = []
-            for entity in converted_entities:
-                if not hasattr(entity, 'offset') or not hasattr(entity, 'length'):
-                    continue
-                    
-                offset = entity.offset
-                length = entity.length
-                
-                # Skip invalid entities
-                if offset < 0 or length <= 0:
-                    continue
-                
-                # Adjust entities that exceed text bounds
-                if offset >= text_length:
-                    continue  # Entity starts beyond text
-                
-                if offset + length > text_length:
-                    # Truncate entity to fit within text bounds
-                    adjusted_length = text_length - offset
-                    if adjusted_length > 0:
-                        # Create new entity with adjusted length
-                        adjusted_entity = MessageEntity(
-                            entity.type,
-                            offset,
-                            adjusted_length,
-                            url=getattr(entity, 'url', None),
-                            user=getattr(entity, 'user', None),
-                            language=getattr(entity, 'language', None),
-                            custom_emoji_id=getattr(entity, 'custom_emoji_id', None)
-                        )
-                        valid_entities.append(adjusted_entity)
-                        logger.debug(f"Adjusted entity length from {length} to {adjusted_length}")
-                else:
-                    valid_entities.append(entity)
-            
-            # Sort entities by offset to maintain order
-            valid_entities.sort(key=lambda e: e.offset)
-            
-            return valid_entities
-            
-        except Exception as e:
+        except (AttributeError, TypeError, ValueError) as e:
             logger.error(f"Error validating entities: {e}")
             return []
     
+    async def _validate_and_convert_entities_async(self, text: str, entities: List,
+                                                   text_length: Optional[int] = None) -> List:
+        """Validate and convert entities, in a worker thread for payloads large enough to stall the event loop"""
+        if text and (len(text) > _OFFLOAD_TEXT_LENGTH or len(entities) > _OFFLOAD_ENTITY_COUNT):
+            return await asyncio.to_thread(self._validate_and_convert_entities, text, entities, 0, text_length)
+        return self._validate_and_convert_entities(text, entities, 0, text_length)
+    
     async def _find_reply_target(self, event, pair: MessagePair) -> Optional[int]:
         """Find the destination message ID for reply"""
         try:
@@ -896,7 +1526,7 @@ class MessageProcessor:
                 return None
             
             # Look up the original message mapping
-            mapping = await self.db_manager.get_message_mapping(event.reply_to_msg_id, pair.id)
+            mapping = await self._get_mapping_cached(event.reply_to_msg_id, pair.id)
             if mapping:
                 return mapping.destination_message_id
             
@@ -906,68 +1536,99 @@ class MessageProcessor:
             logger.error(f"Error finding reply target: {e}")
             return None
     
+    async def _get_mapping_cached(self, source_message_id: int, pair_id: int) -> Optional[MessageMapping]:
+        """Get a message mapping, from the LRU cache when possible"""
+        key = (source_message_id, pair_id)
+        cached = self._mapping_cache.get(key)
+        if cached and time.monotonic() - cached[1] < self.config.MAPPING_CACHE_TTL:
+            self._mapping_cache.move_to_end(key)
+            self.stats.mapping_cache_hits += 1
+            return cached[0]
+        
+        self.stats.mapping_cache_misses += 1
+        # Lookups from concurrent events share one query; the loader flushes buffered mappings first
+        mapping = await self._mapping_loader.load(source_message_id, pair_id)
+        if mapping:
+            self._cache_mapping(mapping)
+        else:
+            self._mapping_cache.pop(key, None)
+        return mapping
+    
+    async def _get_mappings_cached(self, source_message_ids: List[int], pair_id: int) -> Dict[int, MessageMapping]:
+        """Get several message mappings, querying the database once for all cache misses"""
+        mappings = {}
+        missing = []
+        now = time.monotonic()
+        ttl = self.config.MAPPING_CACHE_TTL
+        for source_message_id in source_message_ids:
+            key = (source_message_id, pair_id)
+            cached = self._mapping_cache.get(key)
+            if cached and now - cached[1] < ttl:
+                self._mapping_cache.move_to_end(key)
+                mappings[source_message_id] = cached[0]
+            else:
+                missing.append(source_message_id)
+        self.stats.mapping_cache_hits += len(mappings)
+        
+        if missing:
+            self.stats.mapping_cache_misses += len(missing)
+            # Write through buffered mappings first so a fresh one isn't missed
+            await self.flush_mappings()
+            found = await self.db_manager.get_message_mappings_bulk(missing, pair_id)
+            for mapping in found.values():
+                self._cache_mapping(mapping)
+            mappings.update(found)
+        return mappings
+    
+    def _cache_mapping(self, mapping: MessageMapping):
+        """Remember a message mapping, evicting the least recently used entry when full"""
+        key = (mapping.source_message_id, mapping.pair_id)
+        self._mapping_cache[key] = (mapping, time.monotonic())
+        self._mapping_cache.move_to_end(key)
+        if len(self._mapping_cache) > self.config.MAPPING_CACHE_SIZE:
+            self._mapping_cache.popitem(last=False)
+    
     def _get_message_type(self, event) -> str:
-        """Determine message type"""
-        if event.media:
-            return self._get_media_type(event.media)
-        return "text"
+        """Determine message type, cached on the event since it is asked several times per message"""
+        cached = getattr(event, '_cached_media_type', None)
+        if cached is None:
+            cached = self._get_media_type(event.media) if event.media else "text"
+            event._cached_media_type = cached
+        return cached
     
     def _get_media_type(self, media) -> str:
         """Determine media type with enhanced detection"""
         try:
-            if isinstance(media, MessageMediaPhoto):
-                return "photo"
-            elif isinstance(media, MessageMediaDocument):
+            media_type = _MEDIA_CLASS_TYPES.get(type(media))
+            if media_type:
+                return media_type
+            
+            if isinstance(media, MessageMediaDocument):
                 document = getattr(media, 'document', None)
                 if not document:
                     return "document"
                 
-                # Safely check document attributes first for specific type detection
-                if getattr(document, 'attributes', None):
-                    for attr in document.attributes:
-                        attr_type = type(attr).__name__
-                        
-                        if attr_type == 'DocumentAttributeSticker':
-                            return "sticker"
-                        elif attr_type == 'DocumentAttributeAnimated':
-                            return "animation"
-                        elif attr_type == 'DocumentAttributeVideo':
-                            if getattr(attr, 'round_message', False):
-                                return "video_note"
-                            return "video"
-                        elif attr_type == 'DocumentAttributeAudio':
-                            if getattr(attr, 'voice', False):
-                                return "voice"
-                            return "audio"
+                # Check document attributes first for specific type detection
+                for attr in document.attributes or ():
+                    resolve = _ATTR_MEDIA_TYPES.get(type(attr))
+                    if resolve:
+                        return resolve(attr)
                 
                 # Check MIME type as fallback
                 mime_type = getattr(document, 'mime_type', None)
                 if mime_type:
-                    mime_type = mime_type.lower()
-                    
-                    # Image types
-                    if mime_type.startswith('image/'):
-                        if 'gif' in mime_type:
+                    if not mime_type.islower():
+                        mime_type = mime_type.lower()
+                    if mime_type.startswith(_MIME_MEDIA_PREFIXES):
+                        if mime_type[0] == 'i' and 'gif' in mime_type:
                             return "animation"
-                        return "photo"
-                    
-                    # Video types
-                    elif mime_type.startswith('video/'):
-                        return "video"
-                    
-                    # Audio types
-                    elif mime_type.startswith('audio/'):
-                        return "audio"
+                        return _MIME_PREFIX_TYPES[mime_type[0]]
                 
                 return "document"
             
-            # Handle web page media
-            elif hasattr(media, '__class__') and 'MessageMediaWebPage' in str(media.__class__):
-                return "webpage"
-            
             return "unknown"
             
-        except Exception as e:
+        except (AttributeError, TypeError, ValueError) as e:
             logger.error(f"Error determining media type: {e}")
             return "unknown"
     
@@ -1150,91 +1811,82 @@ class MessageProcessor:
         
         return result_text
     
-    def _convert_entities_for_telegram(self, entities: List) -> List:
-        """Convert Telethon entities to python-telegram-bot format with comprehensive validation"""
+    def _convert_entities_for_telegram(self, entities: List, text_length: Optional[int] = None, shift: int = 0) -> List:
+        """Convert Telethon entities to python-telegram-bot format, moved back by shift and truncated to text_length"""
         try:
-            from telegram import MessageEntity
-            
             if not entities:
                 return []
             
             converted_entities = []
+            prev_offset = -1
+            in_order = True
             
             for entity in entities:
-                entity_type = None
-                try:
-                    # Get entity type safely
-                    if hasattr(entity, '__class__'):
-                        entity_type = entity.__class__.__name__
-                    else:
-                        entity_type = str(type(entity)).split('.')[-1].replace("'", "").replace(">", "")
-                    
-                    offset = getattr(entity, 'offset', 0)
-                    length = getattr(entity, 'length', 0)
-                    
-                    # Validate entity bounds
-                    if offset < 0 or length <= 0:
-                        continue
-                    
-                    # Map Telethon entity types to Telegram entity types with comprehensive coverage
-                    if 'MessageEntityBold' in entity_type or 'Bold' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.BOLD, offset, length))
-                    elif 'MessageEntityItalic' in entity_type or 'Italic' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.ITALIC, offset, length))
-                    elif 'MessageEntityCode' in entity_type or 'Code' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.CODE, offset, length))
-                    elif 'MessageEntityPre' in entity_type or 'Pre' in entity_type:
-                        language = getattr(entity, 'language', None)
-                        converted_entities.append(MessageEntity(MessageEntity.PRE, offset, length, language=language))
-                    elif 'MessageEntityStrike' in entity_type or 'Strike' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.STRIKETHROUGH, offset, length))
-                    elif 'MessageEntityUnderline' in entity_type or 'Underline' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.UNDERLINE, offset, length))
-                    elif 'MessageEntitySpoiler' in entity_type or 'Spoiler' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.SPOILER, offset, length))
-                    elif 'MessageEntityUrl' in entity_type or 'Url' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.URL, offset, length))
-                    elif 'MessageEntityTextUrl' in entity_type or 'TextUrl' in entity_type:
-                        url = getattr(entity, 'url', '')
-                        if url:
-                            converted_entities.append(MessageEntity(MessageEntity.TEXT_LINK, offset, length, url=url))
-                    elif 'MessageEntityMention' in entity_type or 'Mention' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.MENTION, offset, length))
-                    elif 'MessageEntityMentionName' in entity_type or 'MentionName' in entity_type:
-                        user_id = getattr(entity, 'user_id', None)
-                        if user_id:
-                            converted_entities.append(MessageEntity(MessageEntity.TEXT_MENTION, offset, length, user=user_id))
-                    elif 'MessageEntityCustomEmoji' in entity_type or 'CustomEmoji' in entity_type:
-                        custom_emoji_id = getattr(entity, 'document_id', '')
-                        if custom_emoji_id:
-                            converted_entities.append(MessageEntity(MessageEntity.CUSTOM_EMOJI, offset, length, custom_emoji_id=str(custom_emoji_id)))
-                    elif 'MessageEntityHashtag' in entity_type or 'Hashtag' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.HASHTAG, offset, length))
-                    elif 'MessageEntityCashtag' in entity_type or 'Cashtag' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.CASHTAG, offset, length))
-                    elif 'MessageEntityBotCommand' in entity_type or 'BotCommand' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.BOT_COMMAND, offset, length))
-                    elif 'MessageEntityEmail' in entity_type or 'Email' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.EMAIL, offset, length))
-                    elif 'MessageEntityPhone' in entity_type or 'Phone' in entity_type:
-                        converted_entities.append(MessageEntity(MessageEntity.PHONE_NUMBER, offset, length))
-                    else:
-                        # Log unknown entity types for future enhancement
-                        logger.debug(f"Unknown entity type: {entity_type}")
-                        
-                except Exception as entity_error:
-                    logger.warning(f"Failed to convert entity {entity_type or 'unknown'}: {entity_error}")
+                offset = entity.offset - shift
+                length = entity.length
+                if offset < 0:
+                    # Entity begins before the text slice; keep only the part inside it
+                    length += offset
+                    offset = 0
+                
+                # Validate entity bounds
+                if offset < 0 or length <= 0:
+                    continue
+                
+                if text_length is not None:
+                    if offset >= text_length:
+                        continue  # Entity starts beyond text
+                    if offset + length > text_length:
+                        # Truncate entity to fit within text bounds
+                        logger.debug("Adjusted entity length from %d to %d", length, text_length - offset)
+                        length = text_length - offset
+                
+                entity_class = type(entity)
+                factory = _ENTITY_FACTORIES.get(entity_class) or _ENTITY_FACTORIES_BY_NAME.get(entity_class.__name__)
+                if factory is None:
+                    # Log unknown entity types for future enhancement
+                    logger.debug("Unknown entity type: %s", entity_class.__name__)
                     continue
+                
+                converted = factory(entity, offset, length)
+                if converted is not None:
+                    # Telethon normally delivers entities in offset order; only sort if not
+                    if offset < prev_offset:
+                        in_order = False
+                    prev_offset = offset
+                    converted_entities.append(converted)
+            
+            # Sort entities by offset to maintain order
+            if not in_order:
+                converted_entities.sort(key=lambda e: e.offset)
             
             return converted_entities
             
-        except Exception as e:
+        except (AttributeError, TypeError, ValueError) as e:
             logger.error(f"Error converting entities: {e}")
             return []
     
     def get_stats(self) -> Dict[str, int]:
         """Get processing statistics"""
-        return self.stats.copy()
+        stats = asdict(self.stats)
+        stats['url_cache_hits'] = _cached_find_url.cache_info().hits
+        stats['blocked_cache_hits'] = _cached_word_search.cache_info().hits
+        return stats
+    
+    def _get_global_blocked_words(self) -> List[str]:
+        """Resolve the global blocked word list from config, environment or defaults"""
+        blocked_words = getattr(self.config, 'GLOBAL_BLOCKED_WORDS', None)
+        if blocked_words is None:
+            # Fallback to environment variable or default list
+            env_words = os.getenv('GLOBAL_BLOCKED_WORDS', '')
+            if env_words:
+                blocked_words = [word.strip() for word in env_words.split(',') if word.strip()]
+            else:
+                blocked_words = [
+                    "join", "promo", "subscribe", "contact", "spam", "advertisement", 
+                    "click here", "free", "limited time", "act now", "don't miss"
+                ]
+        return blocked_words
     
     def is_blocked_word(self, text: str, pair: Optional[MessagePair] = None) -> bool:
         """
@@ -1244,41 +1896,20 @@ class MessageProcessor:
         if not text:
             return False
         
-        text_lower = text.lower().strip()
-        
         # Check global blocked words from config first
-        BLOCKED_WORDS = getattr(self.config, 'GLOBAL_BLOCKED_WORDS', None)
-        if BLOCKED_WORDS is None:
-            # Fallback to environment variable or default list
-            import os
-            env_words = os.getenv('GLOBAL_BLOCKED_WORDS', '')
-            if env_words:
-                BLOCKED_WORDS = [word.strip() for word in env_words.split(',') if word.strip()]
-            else:
-                BLOCKED_WORDS = [
-                    "join", "promo", "subscribe", "contact", "spam", "advertisement", 
-                    "click here", "free", "limited time", "act now", "don't miss"
-                ]
-        
-        # Check global blocked words
-        if BLOCKED_WORDS:
-            for word in BLOCKED_WORDS:
-                if isinstance(word, str) and word.strip():
-                    word_lower = word.strip().lower()
-                    if word_lower in text_lower:
-                        logger.info(f"Text blocked for global word: '{word}' found in: {text[:100]}...")
-                        return True
+        word = _search_words(self._global_word_matcher, text)
+        if word:
+            logger.info(f"Text blocked for global word: '{word}' found in: {text[:100]}...")
+            return True
         
         # Check pair-specific blocked words
         if pair:
-            pair_blocked_words = pair.filters.get("blocked_words", [])
+            pair_blocked_words = pair.filter_cfg.blocked_words
             if pair_blocked_words:
-                for word in pair_blocked_words:
-                    if isinstance(word, str) and word.strip():
-                        word_lower = word.strip().lower()
-                        if word_lower in text_lower:
-                            logger.info(f"Text blocked for pair {pair.id} word: '{word}' found in: {text[:100]}...")
-                            return True
+                word = _search_words(_get_word_matcher(pair_blocked_words), text)
+                if word:
+                    logger.info(f"Text blocked for pair {pair.id} word: '{word}' found in: {text[:100]}...")
+                    return True
         
         return False
 
@@ -1329,37 +1960,13 @@ class MessageProcessor:
         if not text:
             return False
         
-        import re
-        # Enhanced URL patterns that typically generate webpage previews
-        url_patterns = [
-            r'https?://[^\s<>")\]]+',                       # HTTP/HTTPS URLs (exclude ) and ])
-            r'www\.[^\s<>")\]]+\.[a-zA-Z]{2,}[^\s<>")\]]*', # www URLs with domain and optional path
-            r't\.me/[^\s<>")\]]+',                          # Telegram links
-            r'(?<![a-zA-Z0-9@])[a-zA-Z0-9.-]+\.(com|org|net|edu|gov|co|io|tv|me|ly|to|cc|repl|dev|app)[^\s<>")\]]*', # Common TLD URLs (exclude emails)
-            r'ftp://[^\s<>")\]]+',                          # FTP URLs
-            r'[a-zA-Z0-9.-]+\.replit\.com[^\s<>")\]]*',     # Replit URLs
-            r'[a-zA-Z0-9.-]+\.replit\.app[^\s<>")\]]*',     # Replit app URLs
-        ]
-        
-        # Check for markdown-style links: [text](url)
-        markdown_link_pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-        markdown_matches = re.findall(markdown_link_pattern, text)
-        if markdown_matches:
-            for link_text, link_url in markdown_matches:
-                # Check if the URL part contains a valid URL
-                for pattern in url_patterns:
-                    if re.search(pattern, link_url, re.IGNORECASE):
-                        logger.info(f"Found markdown URL in text: [{link_text}]({link_url})")
-                        return True
-        
-        # Check for regular URL patterns
-        for pattern in url_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                logger.info(f"Found URL pattern '{pattern}' in text: {text[:200]}... (matched: {match.group()})")
-                return True
+        # Markdown-style links: [text](url) are checked first, then regular URL patterns
+        match = _cached_find_url(text) if len(text) <= _RESULT_CACHE_MAX_TEXT else _find_url(text)
+        if match:
+            logger.info(f"Found URL in text: {text[:200]}... (matched: {match})")
+            return True
         
-        logger.debug(f"No URL patterns found in text: {text[:200]}...")
+        logger.debug("No URL patterns found in text: %s...", text[:200])
         return False
     
     def _contains_simple_urls(self, text: str) -> bool:
@@ -1367,28 +1974,14 @@ class MessageProcessor:
         if not text:
             return False
         
-        import re
-        # Simple patterns for URLs that might be missed
-        simple_patterns = [
-            r'[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(/[^\s]*)?',     # Basic domain.tld pattern
-            r'(?:^|\s)([\w.-]+\.[\w]{2,})(?:\s|$)',        # Domain at word boundaries
-        ]
-        
         # Also check inside markdown links
-        markdown_link_pattern = r'\[([^\]]+)\]\(([^)]+)\)'
-        markdown_matches = re.findall(markdown_link_pattern, text)
-        if markdown_matches:
-            for link_text, link_url in markdown_matches:
-                for pattern in simple_patterns:
-                    if re.search(pattern, link_url, re.IGNORECASE):
-                        logger.info(f"Found simple URL in markdown: [{link_text}]({link_url})")
-                        return True
-        
-        for pattern in simple_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
+        for link_text, link_url in _MARKDOWN_LINK_RE.findall(text):
+            for pattern in _SIMPLE_URL_RES:
+                if pattern.search(link_url):
+                    logger.info(f"Found simple URL in markdown: [{link_text}]({link_url})")
+                    return True
         
-        return False
+        return any(pattern.search(text) for pattern in _SIMPLE_URL_RES)
     
     async def is_blocked_image(self, event, pair: MessagePair) -> bool:
         """
@@ -46,15 +46,24 @@ class Config:
         self.MAX_RETRIES = int(os.getenv('MAX_RETRIES', '5'))  # More retries for reliability
         self.RETRY_DELAY = float(os.getenv('RETRY_DELAY', '0.3'))  # Faster retries for high volume
         self.BATCH_SIZE = int(os.getenv('BATCH_SIZE', '50'))  # Larger batches for efficiency
+        self.STATS_FLUSH_INTERVAL = float(os.getenv('STATS_FLUSH_INTERVAL', '1.0'))  # Seconds between pair stats writes
+        self.MAPPING_CACHE_SIZE = int(os.getenv('MAPPING_CACHE_SIZE', '10000'))  # Message mappings kept in memory
+        self.MAPPING_CACHE_TTL = float(os.getenv('MAPPING_CACHE_TTL', '60'))  # Seconds a cached mapping stays valid
+        self.MEDIA_GROUP_WINDOW = float(os.getenv('MEDIA_GROUP_WINDOW', '0'))  # Seconds to collect album parts into one media group; 0 disables
         
         # Connection pooling and optimization for high scale
         self.CONNECTION_POOL_SIZE = int(os.getenv('CONNECTION_POOL_SIZE', '100'))
         self.MAX_CONCURRENT_DOWNLOADS = int(os.getenv('MAX_CONCURRENT_DOWNLOADS', '25'))  # Enhanced for media processing
+        self.MAX_MEDIA_SIZE_MB = int(os.getenv('MAX_MEDIA_SIZE_MB', '50'))  # Bot API upload limit; 0 disables the check
+        self.MEDIA_SPOOL_THRESHOLD = int(os.getenv('MEDIA_SPOOL_THRESHOLD', str(2 * 1024 * 1024)))  # Bytes; smaller media is downloaded to memory
+        self.USE_RAW_BOT_API = os.getenv('USE_RAW_BOT_API', 'false').lower() == 'true'  # Send via raw Bot API calls, skipping Message parsing
         self.CHUNK_PROCESSING_SIZE = int(os.getenv('CHUNK_PROCESSING_SIZE', '10'))  # Process pairs in chunks
         
         # Rate limiting
+        self.RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true'  # Throttle sends per destination chat
         self.RATE_LIMIT_MESSAGES = int(os.getenv('RATE_LIMIT_MESSAGES', '30'))
         self.RATE_LIMIT_WINDOW = int(os.getenv('RATE_LIMIT_WINDOW', '60'))
+        self.CHAT_WORKER_IDLE_TIMEOUT = float(os.getenv('CHAT_WORKER_IDLE_TIMEOUT', '60'))  # Seconds before an idle per-chat send worker exits
         
         # Health monitoring
         self.HEALTH_CHECK_INTERVAL = int(os.getenv('HEALTH_CHECK_INTERVAL', '30'))
@@ -9,6 +9,7 @@ import asyncio
 import aiosqlite
 import os
 import shutil
+import time
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
@@ -16,6 +17,72 @@ from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
+@dataclass(slots=True)
+class PairFilterConfig:
+    """Typed snapshot of the pair filter settings read on every message"""
+    remove_mentions: bool = False
+    mention_placeholder: str = "[User]"
+    header_regex: str = ""
+    footer_regex: str = ""
+    min_message_length: int = 0
+    max_message_length: int = 0
+    allowed_media_types: Optional[frozenset] = None  # None when the pair sets no restriction
+    blocked_words: Tuple[str, ...] = ()
+    custom_regex_filters: Tuple[str, ...] = ()
+    preserve_replies: bool = True
+    block_forwards: bool = False
+    block_links: bool = False
+    watermark_enabled: bool = False
+    watermark_text: str = ""
+    active_watermark: str = ""  # watermark_text when watermarking is enabled, otherwise empty
+    word_replacements: Tuple[Tuple[str, str], ...] = ()
+    regex_replacements: Tuple[Tuple[str, str], ...] = ()
+    time_filters: Optional[Dict[str, Any]] = None  # None when the pair sets no time rules
+    user_filters: Optional[Dict[str, Any]] = None  # None when the pair sets no sender rules
+    has_text_rules: bool = False  # Mentions, header/footer or replacements configured
+    is_passthrough: bool = False  # No text transformations or length limits configured
+
+    @classmethod
+    def from_filters(cls, filters: Dict[str, Any]) -> "PairFilterConfig":
+        """Build the snapshot from a pair's filters dict"""
+        allowed_media = filters.get("allowed_media_types")
+        remove_mentions = bool(filters.get("remove_mentions", False))
+        header_regex = filters.get("header_regex", "") or ""
+        footer_regex = filters.get("footer_regex", "") or ""
+        min_length = filters.get("min_message_length", 0) or 0
+        max_length = filters.get("max_message_length", 0) or 0
+        watermark_enabled = bool(filters.get("watermark_enabled", False))
+        watermark_text = filters.get("watermark_text", "") or ""
+        word_replacements = tuple((filters.get("word_replacements") or {}).items())
+        regex_replacements = tuple((filters.get("regex_replacements") or {}).items())
+        has_text_rules = bool(
+            remove_mentions or header_regex.strip() or footer_regex.strip()
+            or word_replacements or regex_replacements
+        )
+        return cls(
+            remove_mentions=remove_mentions,
+            mention_placeholder=filters.get("mention_placeholder", "[User]"),
+            header_regex=header_regex,
+            footer_regex=footer_regex,
+            min_message_length=min_length,
+            max_message_length=max_length,
+            allowed_media_types=frozenset(allowed_media) if allowed_media is not None else None,
+            blocked_words=tuple(filters.get("blocked_words", []) or ()),
+            custom_regex_filters=tuple(filters.get("custom_regex_filters", []) or ()),
+            preserve_replies=bool(filters.get("preserve_replies", True)),
+            block_forwards=bool(filters.get("block_forwards", False)),
+            block_links=bool(filters.get("block_links", False)),
+            watermark_enabled=watermark_enabled,
+            watermark_text=watermark_text,
+            active_watermark=watermark_text if watermark_enabled else "",
+            word_replacements=word_replacements,
+            regex_replacements=regex_replacements,
+            time_filters=filters.get("time_filters") or None,
+            user_filters=filters.get("user_filters") or None,
+            has_text_rules=has_text_rules,
+            is_passthrough=not (has_text_rules or min_length or max_length),
+        )
+
 @dataclass
 class MessagePair:
     """Data class for message copying pairs"""
@@ -29,6 +96,18 @@ class MessagePair:
     filters: Dict[str, Any] = field(default_factory=dict)
     stats: Dict[str, Any] = field(default_factory=dict)
     created_at: Optional[str] = None
+    _filter_cfg: Optional[PairFilterConfig] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def filter_cfg(self) -> PairFilterConfig:
+        """Parsed filter settings, built on first use and reset by invalidate_filter_cfg"""
+        if self._filter_cfg is None:
+            self._filter_cfg = PairFilterConfig.from_filters(self.filters)
+        return self._filter_cfg
+
+    def invalidate_filter_cfg(self):
+        """Drop the parsed filter settings after self.filters changes"""
+        self._filter_cfg = None
 
     def __post_init__(self):
         if not self.filters:
@@ -65,7 +144,7 @@ class MessagePair:
                 "last_activity": None
             }
 
-@dataclass
+@dataclass(slots=True)
 class MessageMapping:
     """Message mapping data structure"""
     id: int
@@ -82,6 +161,7 @@ class MessageMapping:
     is_reply: bool = False
     reply_to_source_id: Optional[int] = None
     reply_to_dest_id: Optional[int] = None
+    overflow_message_id: Optional[int] = None  # Follow-up message holding caption text past the media limit
 
 class DatabaseManager:
     """Production-ready database manager with async support"""
@@ -89,8 +169,10 @@ class DatabaseManager:
     def __init__(self, db_path: str = "bot.db"):
         self.db_path = db_path
         self.backup_path = f"{db_path}.backup"
-        self._connection_pool = []
+        self._connection_pool: List[aiosqlite.Connection] = []  # Idle connections ready for reuse
         self._pool_size = 5
+        self._source_pairs_cache: Dict[int, Tuple[List[MessagePair], float]] = {}
+        self._source_pairs_ttl = 5.0  # Safety net for changes made outside this manager
         
     async def initialize(self):
         """Initialize database with complete schema"""
@@ -166,6 +248,7 @@ class DatabaseManager:
                     is_reply BOOLEAN DEFAULT FALSE,
                     reply_to_source_id INTEGER,
                     reply_to_dest_id INTEGER,
+                    overflow_message_id INTEGER,
                     UNIQUE(source_message_id, pair_id),
                     FOREIGN KEY(pair_id) REFERENCES pairs(id) ON DELETE CASCADE
                 )
@@ -236,6 +319,12 @@ class DatabaseManager:
                 )
             ''')
 
+            # Add columns introduced after the table was first created; SELECT * relies on them coming last
+            cursor = await conn.execute('PRAGMA table_info(message_mapping)')
+            mapping_columns = {row[1] for row in await cursor.fetchall()}
+            if 'overflow_message_id' not in mapping_columns:
+                await conn.execute('ALTER TABLE message_mapping ADD COLUMN overflow_message_id INTEGER')
+
             # Create indexes for performance
             indexes = [
                 'CREATE INDEX IF NOT EXISTS idx_message_mapping_source ON message_mapping(source_message_id, pair_id)',
@@ -246,6 +335,7 @@ class DatabaseManager:
                 'CREATE INDEX IF NOT EXISTS idx_blocked_images_scope ON blocked_images(block_scope)',
                 'CREATE INDEX IF NOT EXISTS idx_error_logs_time ON error_logs(created_at DESC)',
                 'CREATE INDEX IF NOT EXISTS idx_pairs_status ON pairs(status)',
+                'CREATE INDEX IF NOT EXISTS idx_pairs_source_status ON pairs(source_chat_id, status)',
                 'CREATE INDEX IF NOT EXISTS idx_pairs_bot ON pairs(assigned_bot_index)',
                 'CREATE INDEX IF NOT EXISTS idx_user_subscriptions_expires ON user_subscriptions(expires_at)',
                 'CREATE INDEX IF NOT EXISTS idx_user_subscriptions_user_id ON user_subscriptions(user_id)'
@@ -276,13 +366,24 @@ class DatabaseManager:
     @asynccontextmanager
     async def get_connection(self):
         """Get database connection from pool"""
-        conn = None
-        try:
+        if self._connection_pool:
+            conn = self._connection_pool.pop()
+        else:
             conn = await aiosqlite.connect(self.db_path)
             await conn.execute("PRAGMA foreign_keys = ON")
+        reusable = True
+        try:
             yield conn
         finally:
-            if conn:
+            try:
+                # Never hand out a connection with a half-finished transaction
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception:
+                reusable = False
+            if reusable and len(self._connection_pool) < self._pool_size:
+                self._connection_pool.append(conn)
+            else:
                 await conn.close()
     
     async def create_pair(self, source_chat_id: int, destination_chat_id: int,
@@ -300,6 +401,7 @@ class DatabaseManager:
                 ))
                 pair_id = cursor.lastrowid
                 await conn.commit()
+                self.invalidate_pairs_cache(source_chat_id)
                 
                 logger.info(f"Created pair {pair_id}: {name} ({source_chat_id} -> {destination_chat_id})")
                 return pair_id or 0
@@ -404,6 +506,61 @@ class DatabaseManager:
             logger.error(f"Traceback: {traceback.format_exc()}")
         return pairs
 
+    async def get_active_channel_pairs(self, source_chat_id: int) -> List[MessagePair]:
+        """Get active non-topic pairs for a source chat, cached briefly per chat"""
+        cached = self._source_pairs_cache.get(source_chat_id)
+        if cached and time.monotonic() - cached[1] < self._source_pairs_ttl:
+            return cached[0]
+
+        pairs = []
+        try:
+            async with self.get_connection() as conn:
+                cursor = await conn.execute('''
+                    SELECT id, source_chat_id, destination_chat_id, name, status,
+                           assigned_bot_index, bot_token_id, filters, stats, created_at
+                    FROM pairs WHERE source_chat_id = ? AND status = 'active' ORDER BY id
+                ''', (source_chat_id,))
+                async for row in cursor:
+                    try:
+                        filters_data = json.loads(row[7]) if row[7] else {}
+                    except json.JSONDecodeError:
+                        filters_data = {}
+
+                    # Topic pairs are routed by the topic manager
+                    if filters_data.get('topic_id') is not None:
+                        continue
+
+                    try:
+                        stats_data = json.loads(row[8]) if row[8] else {}
+                    except json.JSONDecodeError:
+                        stats_data = {}
+
+                    pairs.append(MessagePair(
+                        id=row[0],
+                        source_chat_id=row[1],
+                        destination_chat_id=row[2],
+                        name=row[3],
+                        status=row[4],
+                        assigned_bot_index=row[5],
+                        bot_token_id=row[6],
+                        filters=filters_data,
+                        stats=stats_data,
+                        created_at=row[9]
+                    ))
+        except Exception as e:
+            logger.error(f"Failed to get pairs for source chat {source_chat_id}: {e}")
+            return pairs
+
+        self._source_pairs_cache[source_chat_id] = (pairs, time.monotonic())
+        return pairs
+
+    def invalidate_pairs_cache(self, source_chat_id: Optional[int] = None):
+        """Drop cached source-chat pair lists, for one chat or all of them"""
+        if source_chat_id is None:
+            self._source_pairs_cache.clear()
+        else:
+            self._source_pairs_cache.pop(source_chat_id, None)
+
     async def update_pair(self, pair: MessagePair):
         """Update pair"""
         try:
@@ -418,11 +575,29 @@ class DatabaseManager:
                     json.dumps(pair.filters), json.dumps(pair.stats), pair.id
                 ))
                 await conn.commit()
+                pair.invalidate_filter_cfg()
+                self.invalidate_pairs_cache(pair.source_chat_id)
                 logger.debug(f"Updated pair {pair.id}")
         except Exception as e:
             logger.error(f"Failed to update pair {pair.id}: {e}")
             raise
 
+    async def update_pairs_bulk(self, pairs: List[MessagePair]):
+        """Write stats for several pairs in a single transaction"""
+        if not pairs:
+            return
+        try:
+            async with self.get_connection() as conn:
+                await conn.executemany(
+                    "UPDATE pairs SET stats = ? WHERE id = ?",
+                    [(json.dumps(pair.stats), pair.id) for pair in pairs]
+                )
+                await conn.commit()
+                logger.debug(f"Updated stats for {len(pairs)} pairs")
+        except Exception as e:
+            logger.error(f"Failed to bulk update pair stats: {e}")
+            raise
+
     async def delete_pair(self, pair_id: int):
         """Delete pair and all related data"""
         try:
@@ -432,6 +607,7 @@ class DatabaseManager:
                 # Delete the pair
                 await conn.execute('DELETE FROM pairs WHERE id = ?', (pair_id,))
                 await conn.commit()
+                self.invalidate_pairs_cache()
                 logger.info(f"Deleted pair {pair_id}")
         except Exception as e:
             logger.error(f"Failed to delete pair {pair_id}: {e}")
@@ -455,6 +631,7 @@ class DatabaseManager:
                     (json.dumps(filters), pair_id)
                 )
                 await conn.commit()
+                self.invalidate_pairs_cache(pair.source_chat_id)
                 
             logger.debug(f"Updated filter '{key}' for pair {pair_id}: {value}")
             
@@ -470,19 +647,44 @@ class DatabaseManager:
                     INSERT OR REPLACE INTO message_mapping 
                     (source_message_id, destination_message_id, pair_id, bot_index,
                      source_chat_id, destination_chat_id, message_type, has_media,
-                     is_reply, reply_to_source_id, reply_to_dest_id, last_updated)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                     is_reply, reply_to_source_id, reply_to_dest_id, overflow_message_id, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (
                     mapping.source_message_id, mapping.destination_message_id,
                     mapping.pair_id, mapping.bot_index, mapping.source_chat_id,
                     mapping.destination_chat_id, mapping.message_type, mapping.has_media,
-                    mapping.is_reply, mapping.reply_to_source_id, mapping.reply_to_dest_id
+                    mapping.is_reply, mapping.reply_to_source_id, mapping.reply_to_dest_id,
+                    mapping.overflow_message_id
                 ))
                 await conn.commit()
         except Exception as e:
             logger.error(f"Failed to save message mapping: {e}")
             raise
 
+    async def save_message_mappings_bulk(self, mappings: List[MessageMapping]):
+        """Save several message mappings in a single transaction"""
+        if not mappings:
+            return
+        try:
+            async with self.get_connection() as conn:
+                await conn.executemany('''
+                    INSERT OR REPLACE INTO message_mapping 
+                    (source_message_id, destination_message_id, pair_id, bot_index,
+                     source_chat_id, destination_chat_id, message_type, has_media,
+                     is_reply, reply_to_source_id, reply_to_dest_id, overflow_message_id, last_updated)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', [(
+                    mapping.source_message_id, mapping.destination_message_id,
+                    mapping.pair_id, mapping.bot_index, mapping.source_chat_id,
+                    mapping.destination_chat_id, mapping.message_type, mapping.has_media,
+                    mapping.is_reply, mapping.reply_to_source_id, mapping.reply_to_dest_id,
+                    mapping.overflow_message_id
+                ) for mapping in mappings])
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to bulk save message mappings: {e}")
+            raise
+
     async def get_message_mapping(self, source_message_id: int, pair_id: int) -> Optional[MessageMapping]:
         """Get message mapping"""
         try:
@@ -499,6 +701,47 @@ class DatabaseManager:
             logger.error(f"Failed to get message mapping: {e}")
         return None
 
+    async def get_message_mappings_bulk(self, source_message_ids: List[int], pair_id: int) -> Dict[int, MessageMapping]:
+        """Get message mappings for several source messages, keyed by source message ID"""
+        mappings = {}
+        if not source_message_ids:
+            return mappings
+        try:
+            async with self.get_connection() as conn:
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(source_message_ids), 500):
+                    chunk = source_message_ids[start:start + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor = await conn.execute(f'''
+                        SELECT * FROM message_mapping 
+                        WHERE pair_id = ? AND source_message_id IN ({placeholders})
+                    ''', (pair_id, *chunk))
+                    for row in await cursor.fetchall():
+                        mapping = MessageMapping(*row)
+                        mappings[mapping.source_message_id] = mapping
+        except Exception as e:
+            logger.error(f"Failed to bulk get message mappings: {e}")
+        return mappings
+
+    async def get_message_mappings_for_pairs(self, source_message_id: int, pair_ids: List[int]) -> Dict[int, MessageMapping]:
+        """Get one source message's mappings across several pairs, keyed by pair ID"""
+        mappings = {}
+        if not pair_ids:
+            return mappings
+        try:
+            async with self.get_connection() as conn:
+                placeholders = ','.join('?' * len(pair_ids))
+                cursor = await conn.execute(f'''
+                    SELECT * FROM message_mapping 
+                    WHERE source_message_id = ? AND pair_id IN ({placeholders})
+                ''', (source_message_id, *pair_ids))
+                for row in await cursor.fetchall():
+                    mapping = MessageMapping(*row)
+                    mappings[mapping.pair_id] = mapping
+        except Exception as e:
+            logger.error(f"Failed to get message mappings for pairs: {e}")
+        return mappings
+
     async def log_error(self, error_type: str, error_message: str, 
                        pair_id: Optional[int] = None, bot_index: Optional[int] = None,
                        stack_trace: Optional[str] = None):
@@ -947,6 +1190,10 @@ class DatabaseManager:
     async def close(self):
         """Close database connections"""
         try:
+            # Close pooled connections first so the WAL is checkpointed before the backup
+            while self._connection_pool:
+                await self._connection_pool.pop().close()
+
             # Create final backup
             await self._create_backup()
             logger.info("Database connections closed")
@@ -6,15 +6,66 @@ import re
 import json
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any, NamedTuple, Union
+from functools import lru_cache
+from typing import Dict, List, Optional, NamedTuple
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from database import DatabaseManager, MessagePair
+from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
+
+from database import DatabaseManager, MessagePair, PairFilterConfig
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Text filtering runs in a worker thread for texts longer than this
+_OFFLOAD_TEXT_LENGTH = 4096
+
+# MIME prefixes that map to a media type, checked in one startswith call; the first letter picks the type
+_MIME_MEDIA_PREFIXES = ('image/', 'video/', 'audio/')
+_MIME_PREFIX_TYPES = {'i': 'photo', 'v': 'video', 'a': 'audio'}
+
+# Precompiled patterns for mention removal and whitespace cleanup
+# Mention quantifiers are possessive (Python 3.11+): the character classes around them are disjoint,
+# so giving back characters can never produce a match and only costs backtracking
+_MENTION_PAREN_RE = re.compile(r'\(\s*+@[a-zA-Z0-9_]{1,32}+\s*+\)')
+_MENTION_AFTER_WORD_RE = re.compile(r'\b(from|by|via|contact|join)\s++@[a-zA-Z0-9_]{1,32}+\b', re.IGNORECASE)
+_MENTION_AFTER_PUNCT_RE = re.compile(r'([,\.;:!?]\s*+)@[a-zA-Z0-9_]{1,32}+\b')
+_MENTION_OR_LINK_RE = re.compile(
+    r'(?<!\w)@[a-zA-Z0-9_]{1,32}+\b'
+    r'|tg://user\?id=\d++'
+    r'|(?i:(?:https?://)?(?:t\.me|telegram\.me)/[a-zA-Z0-9_]++)'
+)
+_DOUBLE_COMMA_RE = re.compile(r'\s*,\s*,\s*')
+_TRAILING_COMMA_RE = re.compile(r'\s*,\s*$')
+_LEADING_COMMA_RE = re.compile(r'^\s*,\s*')
+_DOUBLE_PERIOD_RE = re.compile(r'\s*\.\s*\.\s*')
+_WHITESPACE_RUN_RE = re.compile(r'\s+')
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+
+_REGEX_METACHARS = frozenset('.^$*+?{}[]\\|()')
+
+@lru_cache(maxsize=64)
+def _pattern_anchor(pattern: str) -> Optional[str]:
+    """Lowercased literal prefix every match of a line pattern must start with, or None if it has none"""
+    if '|' in pattern:
+        return None
+    body = pattern[1:] if pattern.startswith('^') else pattern
+    end = 0
+    while end < len(body) and body[end] not in _REGEX_METACHARS:
+        end += 1
+    # A quantifier after the literal run makes its last character optional
+    if end < len(body) and body[end] in '*?{':
+        end -= 1
+    if end <= 0:
+        return None
+    return body[:end].lower()
+
+# Telethon entity classes that carry a mention, looked up by exact class name
+_MENTION_ENTITY_TYPES = frozenset({
+    'MessageEntityMention', 'MessageEntityMentionName', 'InputMessageEntityMentionName',
+})
+
 class FilterResult(NamedTuple):
     """Result of message filtering"""
     should_copy: bool
@@ -59,12 +110,53 @@ class MessageFilter:
             logger.error(f"Failed to load global blocks: {e}")
             self.global_blocks = {"words": [], "patterns": []}
     
+    def quick_reject(self, event, pair: MessagePair) -> Optional[FilterResult]:
+        """Run the cheap synchronous checks that need no I/O; returns a result only on reject"""
+        try:
+            cfg = pair.filter_cfg
+            # Same text source as should_copy_message, so both length checks agree
+            text = event.text or event.raw_text or ""
+            
+            # Check message length limits
+            min_length = cfg.min_message_length
+            max_length = cfg.max_message_length
+            
+            if min_length > 0 and len(text) < min_length:
+                self.filter_stats.length_filtered += 1
+                return FilterResult(False, f"Message too short: {len(text)} < {min_length}", ["min_length"])
+            
+            if max_length > 0 and len(text) > max_length:
+                self.filter_stats.length_filtered += 1
+                return FilterResult(False, f"Message too long: {len(text)} > {max_length}", ["max_length"])
+            
+            if event.media:
+                # Check media type restrictions (webpage/unknown always pass for URL forwarding)
+                media_type = self._get_media_type(event.media)
+                allowed_media = cfg.allowed_media_types
+                if allowed_media and media_type not in ("webpage", "unknown") and media_type not in allowed_media:
+                    self.filter_stats.media_filtered += 1
+                    return FilterResult(False, f"Media type not allowed: {media_type}", ["media_type"])
+                
+                # Check file size before any download or hashing work
+                max_size = self.config.MAX_MEDIA_SIZE_MB * 1024 * 1024
+                file = event.file
+                if max_size > 0 and file and file.size and file.size > max_size:
+                    self.filter_stats.media_filtered += 1
+                    return FilterResult(False, f"Media too large: {file.size} > {max_size}", ["media_size"])
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error in quick filter checks: {e}")
+            return None
+    
     async def should_copy_message(self, event, pair: MessagePair) -> FilterResult:
         """Determine if message should be copied based on filters"""
         filters_applied = []
         
         try:
             text = event.text or event.raw_text or ""
+            cfg = pair.filter_cfg
             
             # Check global word blocks first
             if await self._check_global_word_blocks(text):
@@ -72,14 +164,14 @@ class MessageFilter:
                 return FilterResult(False, "Global word block", ["global_words"])
             
             # Check pair-specific blocked words
-            blocked_words = pair.filters.get("blocked_words", [])
+            blocked_words = cfg.blocked_words
             if blocked_words and self._contains_blocked_words(text, blocked_words):
                 filters_applied.append("blocked_words")
                 self.filter_stats.blocked_words_hits += 1
                 return FilterResult(False, "Contains blocked words", filters_applied)
             
             # Check custom regex filters
-            regex_filters = pair.filters.get("custom_regex_filters", [])
+            regex_filters = cfg.custom_regex_filters
             if regex_filters:
                 for regex_pattern in regex_filters:
                     if self._matches_regex(text, regex_pattern):
@@ -88,8 +180,8 @@ class MessageFilter:
                         return FilterResult(False, f"Matches regex: {regex_pattern}", filters_applied)
             
             # Check message length limits
-            min_length = pair.filters.get("min_message_length", 0)
-            max_length = pair.filters.get("max_message_length", 0)
+            min_length = cfg.min_message_length
+            max_length = cfg.max_message_length
             
             if min_length > 0 and len(text) < min_length:
                 filters_applied.append("min_length")
@@ -102,14 +194,14 @@ class MessageFilter:
                 return FilterResult(False, f"Message too long: {len(text)} > {max_length}", filters_applied)
             
             # Check if forwards are blocked
-            if pair.filters.get("block_forwards", False) and getattr(event, 'fwd_from', None):
+            if cfg.block_forwards and getattr(event, 'fwd_from', None):
                 filters_applied.append("block_forwards")
                 self.filter_stats.forward_filtered += 1
                 return FilterResult(False, "Forwarded message blocked", filters_applied)
             
             # Check if links are blocked (BUT allow URLs for webpage preview functionality)
             # NOTE: This should typically be False to allow URL forwarding with previews
-            if pair.filters.get("block_links", False) and self._contains_links(text):
+            if cfg.block_links and self._contains_links(text):
                 filters_applied.append("block_links")
                 self.filter_stats.link_filtered += 1
                 logger.warning(f"URL message blocked by block_links filter: {text[:100]}... (Consider disabling block_links for URL forwarding)")
@@ -117,27 +209,25 @@ class MessageFilter:
             
             # Check media type restrictions
             if event.media:
-                allowed_media = pair.filters.get("allowed_media_types", [
-                    "photo", "video", "document", "audio", "voice", "animation", "video_note", "sticker", "webpage", "unknown"
-                ])
+                allowed_media = cfg.allowed_media_types
                 media_type = self._get_media_type(event.media)
                 
                 # Special handling for URL messages with webpage media - these should always be allowed for URL forwarding
                 if media_type == "webpage" or media_type == "unknown":
                     logger.info(f"Allowing webpage/unknown media type for URL forwarding: {media_type}")
-                elif media_type not in allowed_media:
+                elif allowed_media is not None and media_type not in allowed_media:
                     filters_applied.append("media_type")
                     self.filter_stats.media_filtered += 1
                     return FilterResult(False, f"Media type not allowed: {media_type}", filters_applied)
                     return FilterResult(False, f"Media type not allowed: {media_type}", filters_applied)
             
             # Check time-based filters
-            if not await self._check_time_filters(event, pair):
+            if cfg.time_filters and not await self._check_time_filters(event, pair):
                 filters_applied.append("time_filter")
                 return FilterResult(False, "Time-based filter", filters_applied)
             
             # Check user-based filters
-            if not await self._check_user_filters(event, pair):
+            if cfg.user_filters and not await self._check_user_filters(event, pair):
                 filters_applied.append("user_filter")
                 return FilterResult(False, "User-based filter", filters_applied)
             
@@ -148,43 +238,68 @@ class MessageFilter:
             logger.error(f"Error in message filtering: {e}")
             return FilterResult(False, f"Filter error: {e}", ["error"])
     
+    def has_text_rules(self, pair: MessagePair) -> bool:
+        """Whether filter_text would transform text for this pair"""
+        return pair.filter_cfg.has_text_rules
+    
     async def filter_text(self, text: str, pair: MessagePair, entities: Optional[List] = None) -> tuple[str, List]:
         """Apply text transformations and filtering with entity preservation"""
+        logger.info(f"Starting text filtering for pair {pair.id}")
+        # The transforms are pure CPU work; long texts run in a worker thread so other chats aren't stalled.
+        # The worker only sees the immutable filter config; pair.stats is updated back on the event loop,
+        # where the stats flush serializes it.
+        if text and len(text) > _OFFLOAD_TEXT_LENGTH:
+            filtered_text, processed_entities, counts = await asyncio.to_thread(
+                self._scrub_text_sync, text, pair.filter_cfg, entities
+            )
+        else:
+            filtered_text, processed_entities, counts = self._scrub_text_sync(text, pair.filter_cfg, entities)
+        for key, count in counts.items():
+            pair.stats[key] = pair.stats.get(key, 0) + count
+        return filtered_text, processed_entities
+    
+    def _scrub_text_sync(self, text: str, cfg: PairFilterConfig,
+                         entities: Optional[List] = None) -> tuple[str, List, Dict[str, int]]:
+        """Synchronous body of filter_text; returns the text, its entities and per-stat removal counts"""
+        counts: Dict[str, int] = {}
         try:
             filtered_text = text
             processed_entities = entities.copy() if entities else []
             
-            logger.info(f"Starting text filtering for pair {pair.id}")
-            
             # Apply header/footer regex removal even if entities exist
-            header_pattern = pair.filters.get("header_regex", "")
+            header_pattern = cfg.header_regex
             if header_pattern and header_pattern.strip():
                 logger.info(f"Applying header removal with pattern: {header_pattern}")
                 before_header = filtered_text
                 filtered_text, processed_entities = self._remove_headers_with_entities(
                     filtered_text, processed_entities, header_pattern
                 )
-                if before_header != filtered_text:
+                # The helpers hand back the same object when nothing matched, so identity is enough
+                if filtered_text is not before_header:
+                    counts['headers_removed'] = 1
                     logger.info(f"Header removal changed text: {len(before_header)} → {len(filtered_text)} chars")
                 else:
                     logger.info("Header removal: no changes made")
             
-            footer_pattern = pair.filters.get("footer_regex", "")
+            footer_pattern = cfg.footer_regex
             if footer_pattern and footer_pattern.strip():
                 logger.info(f"Applying footer removal with pattern: {footer_pattern}")
                 before_footer = filtered_text
                 filtered_text, processed_entities = self._remove_footers_with_entities(
                     filtered_text, processed_entities, footer_pattern
                 )
-                if before_footer != filtered_text:
+                if filtered_text is not before_footer:
+                    counts['footers_removed'] = 1
                     logger.info(f"Footer removal changed text: {len(before_footer)} → {len(filtered_text)} chars")
                 else:
                     logger.info("Footer removal: no changes made")
             
             # Process mentions with optional placeholders
-            if pair.filters.get("remove_mentions", False):
-                placeholder = pair.filters.get("mention_placeholder", "[User]")
-                filtered_text = self._remove_mentions(filtered_text, placeholder)
+            if cfg.remove_mentions:
+                placeholder = cfg.mention_placeholder
+                filtered_text, mentions_removed = self._remove_mentions_counted(filtered_text, placeholder)
+                if mentions_removed:
+                    counts['mentions_removed'] = mentions_removed
                 # Filter entities that may be out of bounds after mention removal
                 if len(filtered_text) != len(text):
                     processed_entities = [
@@ -194,15 +309,13 @@ class MessageFilter:
                     ]
             
             # Apply word replacements
-            word_replacements = pair.filters.get("word_replacements", {})
-            for old_word, new_word in word_replacements.items():
+            for old_word, new_word in cfg.word_replacements:
                 filtered_text, processed_entities = self._replace_text_with_entities(
                     filtered_text, processed_entities, old_word, new_word
                 )
             
             # Apply regex replacements
-            regex_replacements = pair.filters.get("regex_replacements", {})
-            for pattern, replacement in regex_replacements.items():
+            for pattern, replacement in cfg.regex_replacements:
                 try:
                     compiled_regex = self._get_compiled_regex(pattern)
                     filtered_text, processed_entities = self._regex_replace_with_entities(
@@ -214,11 +327,11 @@ class MessageFilter:
             # Clean up excessive spaces while preserving newlines
             filtered_text = self._clean_excessive_spaces(filtered_text)
             
-            return filtered_text, processed_entities
+            return filtered_text, processed_entities, counts
             
         except Exception as e:
             logger.error(f"Error filtering text: {e}")
-            return text, entities or []
+            return text, entities or [], {}
     
     async def _check_global_word_blocks(self, text: str) -> bool:
         """Check against global blocked words using whole-word matching"""
@@ -287,24 +400,19 @@ class MessageFilter:
     
     def _get_media_type(self, media) -> str:
         """Get media type from media object"""
-        from telethon.tl.types import (
-            MessageMediaPhoto, MessageMediaDocument
-        )
-        
-        if isinstance(media, MessageMediaPhoto):
+        media_class = type(media)
+        if media_class is MessageMediaPhoto:
             return "photo"
-        elif isinstance(media, MessageMediaDocument):
+        elif media_class is MessageMediaDocument:
             if hasattr(media, 'document') and media.document and hasattr(media.document, 'mime_type'):
-                mime_type = getattr(media.document, 'mime_type', '')
-                if mime_type.startswith('image/'):
-                    return "photo"
-                elif mime_type.startswith('video/'):
-                    return "video"
-                elif mime_type.startswith('audio/'):
-                    return "audio"
-                elif 'voice' in mime_type.lower():
+                mime_type = getattr(media.document, 'mime_type', '') or ''
+                if not mime_type.islower():
+                    mime_type = mime_type.lower()
+                if mime_type.startswith(_MIME_MEDIA_PREFIXES):
+                    return _MIME_PREFIX_TYPES[mime_type[0]]
+                if 'voice' in mime_type:
                     return "voice"
-                elif 'video_note' in mime_type.lower():
+                elif 'video_note' in mime_type:
                     return "video_note"
             return "document"
         
@@ -313,7 +421,7 @@ class MessageFilter:
     async def _check_time_filters(self, event, pair: MessagePair) -> bool:
         """Check time-based filtering rules"""
         try:
-            time_filters = pair.filters.get("time_filters", {})
+            time_filters = pair.filter_cfg.time_filters
             if not time_filters:
                 return True
             
@@ -346,7 +454,7 @@ class MessageFilter:
     async def _check_user_filters(self, event, pair: MessagePair) -> bool:
         """Check user-based filtering rules"""
         try:
-            user_filters = pair.filters.get("user_filters", {})
+            user_filters = pair.filter_cfg.user_filters
             if not user_filters:
                 return True
             
@@ -438,11 +546,8 @@ class MessageFilter:
             offset_adjustment = 0
             
             for entity in entities or []:
-                entity_type = getattr(entity, '__class__', {}).get('__name__', str(type(entity)))
-                
                 # Check if this is a mention entity
-                if any(mention_type in entity_type.lower() for mention_type in 
-                       ['mention', 'textmention', 'username']):
+                if type(entity).__name__ in _MENTION_ENTITY_TYPES:
                     
                     entity_offset = getattr(entity, 'offset', 0)
                     entity_length = getattr(entity, 'length', 0)
@@ -589,7 +694,7 @@ class MessageFilter:
         
         for line in lines:
             # Clean multiple consecutive spaces within a line (but keep at least one)
-            cleaned_line = re.sub(r' {2,}', ' ', line)
+            cleaned_line = _MULTI_SPACE_RE.sub(' ', line)
             # Remove trailing spaces from each line
             cleaned_line = cleaned_line.rstrip()
             cleaned_lines.append(cleaned_line)
@@ -761,8 +866,13 @@ class MessageFilter:
     
     def _remove_mentions(self, text: str, placeholder: str = "") -> str:
         """Enhanced mention removal with complete removal while preserving message structure"""
+        return self._remove_mentions_counted(text, placeholder)[0]
+    
+    def _remove_mentions_counted(self, text: str, placeholder: str = "") -> tuple[str, int]:
+        """Mention removal that also returns how many mentions and links were removed"""
         if not text:
-            return text
+            return text, 0
+        removed = 0
         try:
             original_text = text
             
@@ -778,31 +888,32 @@ class MessageFilter:
                 
                 cleaned_line = line
                 
-                # Step 1: Handle mentions in parentheses - remove entire parentheses
-                cleaned_line = re.sub(r'\(\s*@[a-zA-Z0-9_]{1,32}\s*\)', '', cleaned_line)
+                # Mentions need an @ and links a /; skip the regex passes for plain lines
+                if '@' in line or '/' in line:
+                    # Step 1: Handle mentions in parentheses - remove entire parentheses
+                    cleaned_line, n = _MENTION_PAREN_RE.subn('', cleaned_line)
+                    removed += n
                 
-                # Step 2: Handle @mentions with surrounding text patterns
-                # Pattern: "from @username" -> "from"
-                cleaned_line = re.sub(r'\b(from|by|via|contact|join)\s+@[a-zA-Z0-9_]{1,32}\b', r'\1', cleaned_line, flags=re.IGNORECASE)
+                    # Step 2: Handle @mentions with surrounding text patterns
+                    # Pattern: "from @username" -> "from"
+                    cleaned_line, n = _MENTION_AFTER_WORD_RE.subn(r'\1', cleaned_line)
+                    removed += n
                 
-                # Step 3: Handle @mentions preceded by punctuation - clean up punctuation  
-                cleaned_line = re.sub(r'([,\.;:!?]\s*)@[a-zA-Z0-9_]{1,32}\b', r'\1', cleaned_line)
+                    # Step 3: Handle @mentions preceded by punctuation - clean up punctuation  
+                    cleaned_line, n = _MENTION_AFTER_PUNCT_RE.subn(r'\1', cleaned_line)
+                    removed += n
                 
-                # Step 4: Handle standard @mentions (but not email addresses) - complete removal
-                cleaned_line = re.sub(r'(?<!\w)@[a-zA-Z0-9_]{1,32}\b', '', cleaned_line)
-                
-                # Step 5: Handle user ID links - complete removal
-                cleaned_line = re.sub(r'tg://user\?id=\d+', '', cleaned_line)
-                
-                # Step 6: Handle telegram.me and t.me links
-                cleaned_line = re.sub(r'(https?://)?(t\.me|telegram\.me)/[a-zA-Z0-9_]+', '', cleaned_line, flags=re.IGNORECASE)
+                    # Step 4: Handle standard @mentions (but not email addresses), user ID links
+                    # and telegram.me / t.me links - complete removal in a single pass
+                    cleaned_line, n = _MENTION_OR_LINK_RE.subn('', cleaned_line)
+                    removed += n
                 
                 # Clean up formatting issues from removals (within the line only)
-                cleaned_line = re.sub(r'\s*,\s*,\s*', ', ', cleaned_line)  # Fix double commas
-                cleaned_line = re.sub(r'\s*,\s*$', '', cleaned_line)  # Remove trailing comma
-                cleaned_line = re.sub(r'^\s*,\s*', '', cleaned_line)  # Remove leading comma
-                cleaned_line = re.sub(r'\s*\.\s*\.\s*', '. ', cleaned_line)  # Fix double periods
-                cleaned_line = re.sub(r'\s+', ' ', cleaned_line)  # Multiple spaces to single space
+                cleaned_line = _DOUBLE_COMMA_RE.sub(', ', cleaned_line)  # Fix double commas
+                cleaned_line = _TRAILING_COMMA_RE.sub('', cleaned_line)  # Remove trailing comma
+                cleaned_line = _LEADING_COMMA_RE.sub('', cleaned_line)  # Remove leading comma
+                cleaned_line = _DOUBLE_PERIOD_RE.sub('. ', cleaned_line)  # Fix double periods
+                cleaned_line = _WHITESPACE_RUN_RE.sub(' ', cleaned_line)  # Multiple spaces to single space
                 cleaned_line = cleaned_line.strip()
                 
                 cleaned_lines.append(cleaned_line)
@@ -816,13 +927,13 @@ class MessageFilter:
             
             # If result is empty, return original
             if not result or result.isspace():
-                return original_text
+                return original_text, 0
             
-            return result.strip()
+            return result.strip(), removed
             
         except Exception as e:
             logger.error(f"Error removing mentions: {e}")
-            return text
+            return text, 0
     
     def _remove_headers(self, text: str, pattern: str) -> str:
         """Enhanced header removal with single pattern matching preserving message structure"""
@@ -834,11 +945,16 @@ class MessageFilter:
             
             # Validate regex pattern
             try:
-                compiled_pattern = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+                compiled_pattern = self._get_compiled_regex(pattern)
             except re.error as e:
                 logger.warning(f"Invalid header regex pattern '{pattern}': {e}")
                 return text
             
+            # Cheap substring check first: skip the line scan when the pattern's literal prefix never occurs
+            anchor = _pattern_anchor(pattern)
+            if anchor is not None and anchor not in text.lower():
+                return text
+            
             # Split text into lines for line-by-line header removal
             lines = text.split('\n')
             filtered_lines = []
@@ -889,11 +1005,16 @@ class MessageFilter:
             
             # Validate regex pattern
             try:
-                compiled_pattern = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+                compiled_pattern = self._get_compiled_regex(pattern)
             except re.error as e:
                 logger.warning(f"Invalid footer regex pattern '{pattern}': {e}")
                 return text
             
+            # Cheap substring check first: skip the line scan when the pattern's literal prefix never occurs
+            anchor = _pattern_anchor(pattern)
+            if anchor is not None and anchor not in text.lower():
+                return text
+            
             # Split text into lines for line-by-line footer removal
             lines = text.split('\n')
             filtered_lines = list(lines)
@@ -1005,8 +1126,8 @@ class MessageFilter:
             # Apply header removal
             filtered_text = self._remove_headers(text, pattern)
             
-            # If text didn't change, return original entities
-            if filtered_text == text:
+            # If text didn't change, return original entities (the helper returns the same object)
+            if filtered_text is text:
                 return text, entities
             
             # Calculate length difference
@@ -1059,8 +1180,8 @@ class MessageFilter:
             # Apply footer removal
             filtered_text = self._remove_footers(text, pattern)
             
-            # If text didn't change, return original entities
-            if filtered_text == text:
+            # If text didn't change, return original entities (the helper returns the same object)
+            if filtered_text is text:
                 return text, entities
             
             new_length = len(filtered_text)
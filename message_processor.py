@@ -8,9 +8,13 @@ import logging
 import time
 import tempfile
 import os
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Union
+from collections import OrderedDict
 from datetime import datetime
-from dataclasses import dataclass, field
+from contextlib import suppress
+from dataclasses import asdict, dataclass, field
+
+from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
 
 from database import DatabaseManager, MessagePair, MessageMapping
 from filters import MessageFilter, FilterResult
@@ -20,7 +24,37 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+_IMAGE_MIME_PREFIX = 'image/'
+# Telethon media classes are final, so an exact type lookup matches what isinstance would
+_MEDIA_TYPE_NAMES = {MessageMediaPhoto: "photo", MessageMediaDocument: "document"}
+
+def _create_temp_file(data: Optional[bytes] = None) -> str:
+    """Create a temp file, optionally holding data, and return its path (blocking)"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
+        if data is not None:
+            temp_file.write(data)
+    return temp_file.name
+
+def _read_file_if_exists(path: str) -> Optional[bytes]:
+    """Read a whole file, or None when it is missing (blocking)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _reply_to_source_id(event) -> Optional[int]:
+    """ID of the source message an event replies to, if any"""
+    reply_to = getattr(event, 'reply_to', None)
+    return getattr(reply_to, 'reply_to_msg_id', None) if reply_to else None
+
+def _remove_files(paths: List[str]):
+    """Unlink every path, ignoring ones already gone (blocking)"""
+    for path in paths:
+        with suppress(OSError):
+            os.unlink(path)
+
+@dataclass(slots=True)
 class ProcessingResult:
     """Result of message processing"""
     success: bool
@@ -29,6 +63,124 @@ class ProcessingResult:
     filtered: bool = False
     filter_reason: Optional[str] = None
 
+@dataclass(slots=True)
+class TopicProcessorStats:
+    """Processing counters, kept as slot attributes since they are bumped on every message"""
+    messages_processed: int = 0
+    messages_filtered: int = 0
+    errors: int = 0
+    topic_messages: int = 0
+    channel_messages: int = 0
+    replies_preserved: int = 0
+    edits_synced: int = 0
+    deletes_synced: int = 0
+
+class EventMedia:
+    """An event's media, downloaded once and shared by every destination it is forwarded to"""
+    
+    def __init__(self, event, image_handler: ImageHandler, config: Config):
+        self.event = event
+        self.image_handler = image_handler
+        self.config = config
+        self._download: Optional[asyncio.Task] = None
+        # Watermark text -> task producing the watermarked copy, so each distinct watermark is rendered once
+        self._watermarked: Dict[str, asyncio.Task] = {}
+        # Writes in-memory media to disk once when a watermark needs a file to work on
+        self._spill: Optional[asyncio.Task] = None
+        self._paths: List[str] = []
+        self._image: Optional[bool] = None
+    
+    async def get_file(self, pair: MessagePair) -> Optional[Union[str, bytes]]:
+        """Bytes or path of the media prepared for pair, downloading it on first use"""
+        if self._download is None:
+            self._download = asyncio.create_task(self._download_raw())
+        # Shielded so one destination being cancelled doesn't cancel the shared work for the others
+        raw = await asyncio.shield(self._download)
+        if not raw:
+            return None
+        
+        # Apply watermark if enabled and it's an image
+        watermark_text = pair.filter_cfg.active_watermark
+        if not watermark_text or not self._is_image():
+            return raw
+        task = self._watermarked.get(watermark_text)
+        if task is None:
+            task = self._watermarked[watermark_text] = asyncio.create_task(
+                self._apply_watermark(raw, watermark_text, len(self._watermarked))
+            )
+        return await asyncio.shield(task)
+    
+    async def _download_raw(self) -> Optional[Union[str, bytes]]:
+        """Download images within MEDIA_SPOOL_THRESHOLD into memory and everything else to a temp file"""
+        if self._is_image() and self._fits_in_memory():
+            try:
+                return await self.event.client.download_media(self.event.media, file=bytes)
+            except Exception as e:
+                logger.error(f"Error downloading/preparing media: {e}")
+                return None
+        
+        try:
+            temp_path = await asyncio.to_thread(_create_temp_file)
+            self._paths.append(temp_path)
+            await self.event.client.download_media(self.event.media, file=temp_path)
+            return temp_path
+        except Exception as e:
+            logger.error(f"Error downloading/preparing media: {e}")
+            return None
+    
+    async def _apply_watermark(self, raw: Union[str, bytes], watermark_text: str, index: int) -> Union[str, bytes]:
+        """Write a watermarked copy of the image, falling back to the original on failure"""
+        try:
+            if isinstance(raw, bytes):
+                if self._spill is None:
+                    self._spill = asyncio.create_task(self._spill_to_disk(raw))
+                raw_path = await asyncio.shield(self._spill)
+            else:
+                raw_path = raw
+            watermarked_path = f"{raw_path}.{index}.watermarked.jpg"
+            self._paths.append(watermarked_path)
+            if await asyncio.to_thread(self.image_handler.add_text_watermark, raw_path, watermarked_path, watermark_text):
+                logger.debug(f"Applied watermark to image: {watermark_text}")
+                return watermarked_path
+        except Exception as e:
+            logger.error(f"Error applying watermark: {e}")
+        return raw
+    
+    async def _spill_to_disk(self, data: bytes) -> str:
+        """Write in-memory media to a temp file for the watermark renderer"""
+        temp_path = await asyncio.to_thread(_create_temp_file, data)
+        self._paths.append(temp_path)
+        return temp_path
+    
+    def _fits_in_memory(self) -> bool:
+        """Whether the media is known to be within MEDIA_SPOOL_THRESHOLD; unknown sizes go to a temp file"""
+        file = getattr(self.event, 'file', None)
+        expected_size = file.size if file else None
+        return bool(expected_size) and expected_size <= self.config.MEDIA_SPOOL_THRESHOLD
+    
+    def _is_image(self) -> bool:
+        """Whether the media is a photo or an image document, worked out once per event"""
+        if self._image is None:
+            media = self.event.media
+            if isinstance(media, MessageMediaPhoto):
+                self._image = True
+            elif isinstance(media, MessageMediaDocument):
+                mime_type = getattr(getattr(media, 'document', None), 'mime_type', None) or ''
+                # Telegram sends lowercase MIME types, so only lowercase when the fast check misses
+                self._image = mime_type.startswith(_IMAGE_MIME_PREFIX) or mime_type.lower().startswith(_IMAGE_MIME_PREFIX)
+            else:
+                self._image = False
+        return self._image
+    
+    async def cleanup(self):
+        """Remove every file downloaded or written for this event"""
+        for task in (self._download, self._spill, *self._watermarked.values()):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._paths:
+            paths, self._paths = self._paths, []
+            await asyncio.to_thread(_remove_files, paths)
+
 class MessageProcessor:
     """Enhanced message processor with topic support"""
     
@@ -40,22 +192,22 @@ class MessageProcessor:
         self.topic_manager = TopicManager(db_manager)
         
         # Processing statistics
-        self.stats = {
-            "messages_processed": 0,
-            "messages_filtered": 0,
-            "errors": 0,
-            "topic_messages": 0,
-            "channel_messages": 0,
-            "replies_preserved": 0,
-            "edits_synced": 0,
-            "deletes_synced": 0
-        }
+        self.stats = TopicProcessorStats()
+        
+        # New message mappings keyed by (source_message_id, pair_id), written in batches by _flush_mappings_loop
+        self._pending_mappings: Dict[Tuple[int, int], MessageMapping] = {}
+        self._mapping_flusher: Optional[asyncio.Task] = None
+        # Recently used mappings, evicted least recently used first
+        self._mapping_cache: OrderedDict[Tuple[int, int], Tuple[MessageMapping, float]] = OrderedDict()
+        # (chat_id, message_id) -> task processing that new message
+        self._inflight: Dict[Tuple[int, int], asyncio.Task] = {}
         
     async def initialize(self):
         """Initialize message processor"""
         try:
-            await self.message_filter.initialize()
-            await self.topic_manager.initialize()
+            # The filter and topic manager load independent state, so load them concurrently
+            await asyncio.gather(self.message_filter.initialize(), self.topic_manager.initialize())
+            self._mapping_flusher = asyncio.create_task(self._flush_mappings_loop())
             logger.info("Message processor initialized")
         except Exception as e:
             logger.error(f"Failed to initialize message processor: {e}")
@@ -64,40 +216,114 @@ class MessageProcessor:
     async def shutdown(self):
         """Shutdown message processor"""
         try:
+            if self._mapping_flusher:
+                self._mapping_flusher.cancel()
+                with suppress(asyncio.CancelledError):
+                    await self._mapping_flusher
+                self._mapping_flusher = None
+            await self.flush_mappings()
             await self.topic_manager.shutdown()
             logger.info("Message processor shutdown complete")
         except Exception as e:
             logger.error(f"Error during message processor shutdown: {e}")
     
+    async def flush_mappings(self):
+        """Write all buffered message mappings in one transaction"""
+        if not self._pending_mappings:
+            return
+        pending, self._pending_mappings = self._pending_mappings, {}
+        try:
+            await self.db_manager.save_message_mappings_bulk(list(pending.values()))
+        except Exception as e:
+            logger.error(f"Error flushing message mappings: {e}")
+            # Requeue unless a newer mapping for the same message arrived meanwhile
+            for key, mapping in pending.items():
+                self._pending_mappings.setdefault(key, mapping)
+    
+    async def _flush_mappings_loop(self):
+        """Periodically flush buffered message mappings"""
+        while True:
+            await asyncio.sleep(self.config.STATS_FLUSH_INTERVAL)
+            await self.flush_mappings()
+    
+    async def _queue_mapping(self, mapping: MessageMapping):
+        """Buffer a mapping for the next batched write"""
+        self._pending_mappings[(mapping.source_message_id, mapping.pair_id)] = mapping
+        self._cache_mapping(mapping)
+        if len(self._pending_mappings) >= self.config.BATCH_SIZE:
+            await self.flush_mappings()
+    
+    async def _get_mappings_for_pairs(self, source_message_id: int, pairs: List[MessagePair]) -> Dict[int, MessageMapping]:
+        """Get a source message's mappings for several pairs from the LRU cache or unflushed buffer, querying the database once for the rest"""
+        mappings = {}
+        missing = []
+        now = time.monotonic()
+        for pair in pairs:
+            key = (source_message_id, pair.id)
+            cached = self._mapping_cache.get(key)
+            if cached and now - cached[1] < self.config.MAPPING_CACHE_TTL:
+                self._mapping_cache.move_to_end(key)
+                mappings[pair.id] = cached[0]
+            elif key in self._pending_mappings:
+                mappings[pair.id] = self._pending_mappings[key]
+            else:
+                missing.append(pair.id)
+        
+        if missing:
+            found = await self.db_manager.get_message_mappings_for_pairs(source_message_id, missing)
+            for mapping in found.values():
+                self._cache_mapping(mapping)
+            mappings.update(found)
+        return mappings
+    
+    def _cache_mapping(self, mapping: MessageMapping):
+        """Remember a message mapping, evicting the least recently used entry when full"""
+        key = (mapping.source_message_id, mapping.pair_id)
+        self._mapping_cache[key] = (mapping, time.monotonic())
+        self._mapping_cache.move_to_end(key)
+        if len(self._mapping_cache) > self.config.MAPPING_CACHE_SIZE:
+            self._mapping_cache.popitem(last=False)
+    
     async def process_new_message(self, event, bot_manager) -> List[ProcessingResult]:
         """Process new message - handles both channel and topic messages"""
+        # A duplicate delivery of an event still being processed shares that run instead of forwarding it twice
+        key = (event.chat_id, event.id)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._process_new_message(event, bot_manager))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def _process_new_message(self, event, bot_manager) -> List[ProcessingResult]:
+        """Route a new message to the topic or channel path and record the outcome"""
         results = []
         
         try:
-            self.stats["messages_processed"] += 1
+            self.stats.messages_processed += 1
             
             # Determine if this is a topic message
             if self.topic_manager.is_topic_message(event):
                 logger.debug(f"Processing topic message from chat {event.chat_id}")
-                self.stats["topic_messages"] += 1
+                self.stats.topic_messages += 1
                 results = await self._process_topic_message(event, bot_manager)
             else:
                 logger.debug(f"Processing channel message from chat {event.chat_id}")
-                self.stats["channel_messages"] += 1
+                self.stats.channel_messages += 1
                 results = await self._process_channel_message(event, bot_manager)
             
             # Update statistics
             for result in results:
                 if result.filtered:
-                    self.stats["messages_filtered"] += 1
+                    self.stats.messages_filtered += 1
                 if not result.success:
-                    self.stats["errors"] += 1
+                    self.stats.errors += 1
             
             return results
             
         except Exception as e:
             logger.error(f"Error processing message: {e}")
-            self.stats["errors"] += 1
+            self.stats.errors += 1
             return [ProcessingResult(success=False, error=str(e))]
     
     async def _process_topic_message(self, event, bot_manager) -> List[ProcessingResult]:
@@ -119,79 +345,22 @@ class MessageProcessor:
                 logger.debug(f"No destinations configured for topic {topic_id} in chat {source_chat_id}")
                 return [ProcessingResult(success=False, error="No destinations configured")]
             
-            # Process for each destination
-            for dest_info in destinations:
-                try:
-                    pair = dest_info['pair']
-                    dest_channel_id = dest_info['dest_channel_id']
-                    
-                    # Apply filters
-                    filter_result = await self.message_filter.should_copy_message(event, pair)
-                    if not filter_result.should_copy:
-                        logger.debug(f"Message filtered for topic pair {pair.id}: {filter_result.reason}")
-                        results.append(ProcessingResult(
-                            success=True, 
-                            filtered=True, 
-                            filter_reason=filter_result.reason
-                        ))
-                        continue
-                    
-                    # Check for image blocking
-                    if await self.image_handler.is_image_blocked(event, pair):
-                        logger.debug(f"Image blocked for topic pair {pair.id}")
-                        results.append(ProcessingResult(
-                            success=True, 
-                            filtered=True, 
-                            filter_reason="Image blocked as duplicate"
-                        ))
-                        continue
-                    
-                    # Handle reply logic
-                    reply_to_msg_id = None
-                    if hasattr(event, 'reply_to') and event.reply_to:
-                        reply_to_source_id = getattr(event.reply_to, 'reply_to_msg_id', None)
-                        if reply_to_source_id:
-                            reply_to_msg_id = await self.topic_manager.get_forwarded_message_id(
-                                source_chat_id, topic_id, reply_to_source_id, dest_channel_id
-                            )
-                            if reply_to_msg_id:
-                                logger.debug(f"Found reply mapping: {reply_to_source_id} → {reply_to_msg_id}")
-                                self.stats["replies_preserved"] += 1
-                    
-                    # Forward the message
-                    result = await self._forward_topic_message(
-                        event, pair, bot_manager, reply_to_msg_id
+            # Destinations are independent, so process them concurrently; the media is downloaded once for all of them
+            media = EventMedia(event, self.image_handler, self.config)
+            reply_to_source_id = _reply_to_source_id(event)
+            try:
+                raw_results = await asyncio.gather(*(
+                    self._process_topic_destination(
+                        event, source_chat_id, topic_id, dest_info, bot_manager, media, reply_to_source_id
                     )
-                    
-                    # Store mapping if successful
-                    if result.success and result.message_id:
-                        await self.topic_manager.store_mapping(
-                            source_chat_id, topic_id, event.id,
-                            dest_channel_id, result.message_id
-                        )
-                        
-                        # Also store in regular message mapping for consistency
-                        mapping = MessageMapping(
-                            id=0,
-                            source_message_id=event.id,
-                            destination_message_id=result.message_id,
-                            pair_id=pair.id,
-                            bot_index=pair.assigned_bot_index,
-                            source_chat_id=source_chat_id,
-                            destination_chat_id=dest_channel_id,
-                            message_type=self._get_message_type(event),
-                            has_media=bool(event.media),
-                            is_reply=bool(reply_to_msg_id),
-                            reply_to_source_id=getattr(event.reply_to, 'reply_to_msg_id', None) if hasattr(event, 'reply_to') and event.reply_to else None,
-                            reply_to_dest_id=reply_to_msg_id
-                        )
-                        await self.db_manager.save_message_mapping(mapping)
-                    
-                    results.append(result)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing topic message for destination {dest_channel_id}: {e}")
-                    results.append(ProcessingResult(success=False, error=str(e)))
+                    for dest_info in destinations
+                ), return_exceptions=True)
+            finally:
+                await media.cleanup()
+            results = [
+                ProcessingResult(success=False, error=str(result)) if isinstance(result, BaseException) else result
+                for result in raw_results
+            ]
             
             return results
             
@@ -204,79 +373,33 @@ class MessageProcessor:
         results = []
         
         try:
-            # Get pairs for this source chat
-            pairs = await self.db_manager.get_all_pairs()
-            source_pairs = [
-                pair for pair in pairs 
-                if pair.source_chat_id == event.chat_id and 
-                pair.status == "active" and
-                pair.filters.get('topic_id') is None  # Exclude topic pairs
-            ]
+            # Get active non-topic pairs for this source chat
+            source_pairs = await self.db_manager.get_active_channel_pairs(event.chat_id)
             
             if not source_pairs:
                 return [ProcessingResult(success=False, error="No active pairs found")]
             
-            # Process for each destination
-            for pair in source_pairs:
-                try:
-                    # Apply filters
-                    filter_result = await self.message_filter.should_copy_message(event, pair)
-                    if not filter_result.should_copy:
-                        results.append(ProcessingResult(
-                            success=True, 
-                            filtered=True, 
-                            filter_reason=filter_result.reason
-                        ))
-                        continue
-                    
-                    # Check for image blocking
-                    if await self.image_handler.is_image_blocked(event, pair):
-                        results.append(ProcessingResult(
-                            success=True, 
-                            filtered=True, 
-                            filter_reason="Image blocked as duplicate"
-                        ))
-                        continue
-                    
-                    # Handle reply logic (existing channel logic)
-                    reply_to_msg_id = None
-                    if hasattr(event, 'reply_to') and event.reply_to:
-                        reply_to_source_id = getattr(event.reply_to, 'reply_to_msg_id', None)
-                        if reply_to_source_id:
-                            # Look up in regular message mapping
-                            mapping = await self.db_manager.get_message_mapping(reply_to_source_id, pair.id)
-                            if mapping:
-                                reply_to_msg_id = mapping.destination_message_id
-                                self.stats["replies_preserved"] += 1
-                    
-                    # Forward the message
-                    result = await self._forward_channel_message(
-                        event, pair, bot_manager, reply_to_msg_id
+            # Resolve the replied-to message for every pair in one lookup
+            reply_mappings = {}
+            reply_to_source_id = _reply_to_source_id(event)
+            if reply_to_source_id:
+                reply_mappings = await self._get_mappings_for_pairs(reply_to_source_id, source_pairs)
+            
+            # Pairs are independent, so process them concurrently; the media is downloaded once for all of them
+            media = EventMedia(event, self.image_handler, self.config)
+            try:
+                raw_results = await asyncio.gather(*(
+                    self._process_channel_pair(
+                        event, pair, bot_manager, media, reply_to_source_id, reply_mappings.get(pair.id)
                     )
-                    
-                    # Store mapping if successful
-                    if result.success and result.message_id:
-                        mapping = MessageMapping(
-                            id=0,
-                            source_message_id=event.id,
-                            destination_message_id=result.message_id,
-                            pair_id=pair.id,
-                            bot_index=pair.assigned_bot_index,
-                            source_chat_id=event.chat_id,
-                            destination_chat_id=pair.destination_chat_id,
-                            message_type=self._get_message_type(event),
-                            has_media=bool(event.media),
-                            is_reply=bool(reply_to_msg_id),
-                            reply_to_source_id=getattr(event.reply_to, 'reply_to_msg_id', None) if hasattr(event, 'reply_to') and event.reply_to else None,
-                            reply_to_dest_id=reply_to_msg_id
-                        )
-                        await self.db_manager.save_message_mapping(mapping)
-                    
-                    results.append(result)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing channel message for pair {pair.id}: {e}")
-                    results.append(ProcessingResult(success=False, error=str(e)))
+                    for pair in source_pairs
+                ), return_exceptions=True)
+            finally:
+                await media.cleanup()
+            results = [
+                ProcessingResult(success=False, error=str(result)) if isinstance(result, BaseException) else result
+                for result in raw_results
+            ]
             
             return results
             
@@ -284,7 +407,136 @@ class MessageProcessor:
             logger.error(f"Error in channel message processing: {e}")
             return [ProcessingResult(success=False, error=str(e))]
     
-    async def _forward_topic_message(self, event, pair: MessagePair, bot_manager, reply_to_msg_id: Optional[int]) -> ProcessingResult:
+    async def _process_topic_destination(self, event, source_chat_id: int, topic_id: int,
+                                         dest_info: Dict[str, Any], bot_manager, media: EventMedia,
+                                         reply_to_source_id: Optional[int]) -> ProcessingResult:
+        """Filter, forward and record a topic message for one destination"""
+        pair = dest_info['pair']
+        dest_channel_id = dest_info['dest_channel_id']
+        try:
+            # Apply filters
+            filter_result = await self.message_filter.should_copy_message(event, pair)
+            if not filter_result.should_copy:
+                logger.debug(f"Message filtered for topic pair {pair.id}: {filter_result.reason}")
+                return ProcessingResult(
+                    success=True, 
+                    filtered=True, 
+                    filter_reason=filter_result.reason
+                )
+            
+            # Check for image blocking
+            if await self.image_handler.is_image_blocked(event, pair):
+                logger.debug(f"Image blocked for topic pair {pair.id}")
+                return ProcessingResult(
+                    success=True, 
+                    filtered=True, 
+                    filter_reason="Image blocked as duplicate"
+                )
+            
+            # Handle reply logic
+            reply_to_msg_id = None
+            if reply_to_source_id:
+                reply_to_msg_id = await self.topic_manager.get_forwarded_message_id(
+                    source_chat_id, topic_id, reply_to_source_id, dest_channel_id
+                )
+                if reply_to_msg_id:
+                    logger.debug(f"Found reply mapping: {reply_to_source_id} → {reply_to_msg_id}")
+                    self.stats.replies_preserved += 1
+            
+            # Forward the message
+            result = await self._forward_topic_message(
+                event, pair, bot_manager, reply_to_msg_id, media
+            )
+            
+            # Store mapping if successful
+            if result.success and result.message_id:
+                await self.topic_manager.store_mapping(
+                    source_chat_id, topic_id, event.id,
+                    dest_channel_id, result.message_id
+                )
+                
+                # Also store in regular message mapping for consistency
+                mapping = MessageMapping(
+                    id=0,
+                    source_message_id=event.id,
+                    destination_message_id=result.message_id,
+                    pair_id=pair.id,
+                    bot_index=pair.assigned_bot_index,
+                    source_chat_id=source_chat_id,
+                    destination_chat_id=dest_channel_id,
+                    message_type=self._get_message_type(event),
+                    has_media=bool(event.media),
+                    is_reply=bool(reply_to_msg_id),
+                    reply_to_source_id=reply_to_source_id,
+                    reply_to_dest_id=reply_to_msg_id
+                )
+                await self._queue_mapping(mapping)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing topic message for destination {dest_channel_id}: {e}")
+            return ProcessingResult(success=False, error=str(e))
+    
+    async def _process_channel_pair(self, event, pair: MessagePair, bot_manager, media: EventMedia,
+                                    reply_to_source_id: Optional[int],
+                                    reply_mapping: Optional[MessageMapping]) -> ProcessingResult:
+        """Filter, forward and record a channel message for one pair"""
+        try:
+            # Apply filters
+            filter_result = await self.message_filter.should_copy_message(event, pair)
+            if not filter_result.should_copy:
+                return ProcessingResult(
+                    success=True, 
+                    filtered=True, 
+                    filter_reason=filter_result.reason
+                )
+            
+            # Check for image blocking
+            if await self.image_handler.is_image_blocked(event, pair):
+                return ProcessingResult(
+                    success=True, 
+                    filtered=True, 
+                    filter_reason="Image blocked as duplicate"
+                )
+            
+            # Handle reply logic; the mapping was resolved for all pairs up front
+            reply_to_msg_id = None
+            if reply_mapping:
+                reply_to_msg_id = reply_mapping.destination_message_id
+                self.stats.replies_preserved += 1
+            
+            # Forward the message
+            result = await self._forward_channel_message(
+                event, pair, bot_manager, reply_to_msg_id, media
+            )
+            
+            # Store mapping if successful
+            if result.success and result.message_id:
+                mapping = MessageMapping(
+                    id=0,
+                    source_message_id=event.id,
+                    destination_message_id=result.message_id,
+                    pair_id=pair.id,
+                    bot_index=pair.assigned_bot_index,
+                    source_chat_id=event.chat_id,
+                    destination_chat_id=pair.destination_chat_id,
+                    message_type=self._get_message_type(event),
+                    has_media=bool(event.media),
+                    is_reply=bool(reply_to_msg_id),
+                    reply_to_source_id=reply_to_source_id,
+                    reply_to_dest_id=reply_to_msg_id
+                )
+                await self._queue_mapping(mapping)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing channel message for pair {pair.id}: {e}")
+            return ProcessingResult(success=False, error=str(e))
+    
+    async def _forward_topic_message(self, event, pair: MessagePair, bot_manager, reply_to_msg_id: Optional[int],
+                                    media: EventMedia) -> ProcessingResult:
         """Forward topic message to channel"""
         try:
             # Get bot for this pair
@@ -292,13 +544,15 @@ class MessageProcessor:
             if not bot:
                 return ProcessingResult(success=False, error="No bot available")
             
-            # Process message content
-            processed_content = await self._process_message_content(event, pair)
-            
-            # Prepare media if present
-            media_file = None
+            # Process content while the media downloads; the media is shared with other destinations
+            # and cleaned up after all of them
             if event.media:
-                media_file = await self._download_and_prepare_media(event, pair)
+                processed_content, media_file = await asyncio.gather(
+                    self._process_message_content(event, pair), media.get_file(pair)
+                )
+            else:
+                processed_content = await self._process_message_content(event, pair)
+                media_file = None
             
             # Send message
             sent_message = await self._send_message(
@@ -306,13 +560,6 @@ class MessageProcessor:
                 media_file, reply_to_msg_id
             )
             
-            # Cleanup temp file
-            if media_file and os.path.exists(media_file):
-                try:
-                    os.unlink(media_file)
-                except:
-                    pass
-            
             if sent_message:
                 return ProcessingResult(success=True, message_id=sent_message.message_id)
             else:
@@ -322,7 +569,8 @@ class MessageProcessor:
             logger.error(f"Error forwarding topic message: {e}")
             return ProcessingResult(success=False, error=str(e))
     
-    async def _forward_channel_message(self, event, pair: MessagePair, bot_manager, reply_to_msg_id: Optional[int]) -> ProcessingResult:
+    async def _forward_channel_message(self, event, pair: MessagePair, bot_manager, reply_to_msg_id: Optional[int],
+                                    media: EventMedia) -> ProcessingResult:
         """Forward channel message (existing logic)"""
         try:
             # Get bot for this pair
@@ -330,13 +578,15 @@ class MessageProcessor:
             if not bot:
                 return ProcessingResult(success=False, error="No bot available")
             
-            # Process message content
-            processed_content = await self._process_message_content(event, pair)
-            
-            # Prepare media if present
-            media_file = None
+            # Process content while the media downloads; the media is shared with other destinations
+            # and cleaned up after all of them
             if event.media:
-                media_file = await self._download_and_prepare_media(event, pair)
+                processed_content, media_file = await asyncio.gather(
+                    self._process_message_content(event, pair), media.get_file(pair)
+                )
+            else:
+                processed_content = await self._process_message_content(event, pair)
+                media_file = None
             
             # Send message
             sent_message = await self._send_message(
@@ -344,13 +594,6 @@ class MessageProcessor:
                 media_file, reply_to_msg_id
             )
             
-            # Cleanup temp file
-            if media_file and os.path.exists(media_file):
-                try:
-                    os.unlink(media_file)
-                except:
-                    pass
-            
             if sent_message:
                 return ProcessingResult(success=True, message_id=sent_message.message_id)
             else:
@@ -362,10 +605,10 @@ class MessageProcessor:
     
     async def process_edit(self, event, bot_manager) -> List[ProcessingResult]:
         """Process message edit - handles both channel and topic edits"""
-        results = []
+        edits = []
         
         try:
-            self.stats["edits_synced"] += 1
+            self.stats.edits_synced += 1
             
             # Check if this is a topic message
             if self.topic_manager.is_topic_message(event):
@@ -378,41 +621,38 @@ class MessageProcessor:
                         event, source_chat_id, topic_id
                     )
                     
+                    # Index the destination pairs once rather than rescanning them for every copy
+                    destinations = await self.topic_manager.get_topic_destinations(source_chat_id, topic_id)
+                    pairs_by_dest: Dict[int, MessagePair] = {}
+                    for dest_info in destinations:
+                        pairs_by_dest.setdefault(dest_info['dest_channel_id'], dest_info['pair'])
+                    
                     for dest_channel_id, dest_msg_id in forwarded_copies:
-                        # Get pair for filtering
-                        destinations = await self.topic_manager.get_topic_destinations(source_chat_id, topic_id)
-                        pair = None
-                        for dest_info in destinations:
-                            if dest_info['dest_channel_id'] == dest_channel_id:
-                                pair = dest_info['pair']
-                                break
-                        
+                        pair = pairs_by_dest.get(dest_channel_id)
                         if pair:
-                            result = await self._edit_forwarded_message(
+                            edits.append(self._edit_forwarded_message(
                                 event, pair, bot_manager, dest_channel_id, dest_msg_id
-                            )
-                            results.append(result)
+                            ))
             else:
                 # Channel edit logic (existing)
-                pairs = await self.db_manager.get_all_pairs()
-                source_pairs = [
-                    pair for pair in pairs 
-                    if pair.source_chat_id == event.chat_id and 
-                    pair.status == "active" and
-                    pair.filters.get('topic_id') is None
-                ]
+                source_pairs = await self.db_manager.get_active_channel_pairs(event.chat_id)
+                mappings = await self._get_mappings_for_pairs(event.id, source_pairs)
                 
                 for pair in source_pairs:
                     # Find the forwarded message
-                    mapping = await self.db_manager.get_message_mapping(event.id, pair.id)
+                    mapping = mappings.get(pair.id)
                     if mapping:
-                        result = await self._edit_forwarded_message(
+                        edits.append(self._edit_forwarded_message(
                             event, pair, bot_manager, 
                             mapping.destination_chat_id, mapping.destination_message_id
-                        )
-                        results.append(result)
+                        ))
             
-            return results
+            # Copies live in independent chats, so edit them concurrently; one failure doesn't stop the rest
+            outcomes = await asyncio.gather(*edits, return_exceptions=True)
+            return [
+                ProcessingResult(success=False, error=str(outcome)) if isinstance(outcome, BaseException) else outcome
+                for outcome in outcomes
+            ]
             
         except Exception as e:
             logger.error(f"Error processing edit: {e}")
@@ -423,7 +663,7 @@ class MessageProcessor:
         results = []
         
         try:
-            self.stats["deletes_synced"] += 1
+            self.stats.deletes_synced += 1
             
             # Check if this is a topic message
             if self.topic_manager.is_topic_message(event):
@@ -436,29 +676,29 @@ class MessageProcessor:
                         event, source_chat_id, topic_id
                     )
                     
-                    for dest_channel_id, dest_msg_id in forwarded_copies:
-                        result = await self._delete_forwarded_message(
-                            bot_manager, dest_channel_id, dest_msg_id
-                        )
-                        results.append(result)
+                    # Copies live in independent chats, so delete them concurrently
+                    results = list(await asyncio.gather(*(
+                        self._delete_forwarded_message(bot_manager, dest_channel_id, dest_msg_id)
+                        for dest_channel_id, dest_msg_id in forwarded_copies
+                    )))
             else:
                 # Channel delete logic (existing)
-                pairs = await self.db_manager.get_all_pairs()
-                source_pairs = [
-                    pair for pair in pairs 
-                    if pair.source_chat_id == event.chat_id and 
-                    pair.status == "active" and
-                    pair.filters.get('topic_id') is None
-                ]
+                source_pairs = await self.db_manager.get_active_channel_pairs(event.chat_id)
+                
+                mappings = await self._get_mappings_for_pairs(event.id, source_pairs)
                 
+                targets = []
                 for pair in source_pairs:
                     # Find the forwarded message
-                    mapping = await self.db_manager.get_message_mapping(event.id, pair.id)
+                    mapping = mappings.get(pair.id)
+                    self._mapping_cache.pop((event.id, pair.id), None)
                     if mapping:
-                        result = await self._delete_forwarded_message(
-                            bot_manager, mapping.destination_chat_id, mapping.destination_message_id
-                        )
-                        results.append(result)
+                        targets.append((mapping.destination_chat_id, mapping.destination_message_id))
+                
+                results = list(await asyncio.gather(*(
+                    self._delete_forwarded_message(bot_manager, dest_chat_id, dest_msg_id)
+                    for dest_chat_id, dest_msg_id in targets
+                )))
             
             return results
             
@@ -473,10 +713,13 @@ class MessageProcessor:
             original_text = event.text or event.raw_text or ""
             entities = getattr(event, 'entities', []) or []
             
-            # Apply text filtering
-            filtered_text, filtered_entities = await self.message_filter.filter_text(
-                original_text, pair, entities
-            )
+            # Apply text filtering; pairs without text rules keep the original untouched
+            if self.message_filter.has_text_rules(pair):
+                filtered_text, filtered_entities = await self.message_filter.filter_text(
+                    original_text, pair, entities
+                )
+            else:
+                filtered_text, filtered_entities = original_text, entities
             
             # Prepare content
             content = {
@@ -486,8 +729,8 @@ class MessageProcessor:
             }
             
             # Add watermark if enabled
-            watermark_text = pair.filters.get("watermark_text", "")
-            if pair.filters.get("watermark_enabled", False) and watermark_text:
+            watermark_text = pair.filter_cfg.active_watermark
+            if watermark_text:
                 if content['text']:
                     content['text'] += f"\n\n{watermark_text}"
                 else:
@@ -499,62 +742,8 @@ class MessageProcessor:
             logger.error(f"Error processing message content: {e}")
             return {'text': event.text or "", 'entities': [], 'parse_mode': None}
     
-    async def _download_and_prepare_media(self, event, pair: MessagePair) -> Optional[str]:
-        """Download and prepare media with watermarking if enabled"""
-        try:
-            if not event.media:
-                return None
-            
-            # Create temp file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-            temp_path = temp_file.name
-            temp_file.close()
-            
-            try:
-                # Download media
-                await event.client.download_media(event.media, file=temp_path)
-                
-                # Check if watermarking is enabled for images
-                watermark_enabled = pair.filters.get("watermark_enabled", False)
-                watermark_text = pair.filters.get("watermark_text", "")
-                
-                # Apply watermark if enabled and it's an image
-                if watermark_enabled and watermark_text:
-                    from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
-                    
-                    is_image = False
-                    if isinstance(event.media, MessageMediaPhoto):
-                        is_image = True
-                    elif isinstance(event.media, MessageMediaDocument):
-                        document = getattr(event.media, 'document', None)
-                        if document and hasattr(document, 'mime_type'):
-                            mime_type = getattr(document, 'mime_type', '').lower()
-                            is_image = mime_type.startswith('image/')
-                    
-                    if is_image:
-                        # Create watermarked version
-                        watermarked_path = f"{temp_path}.watermarked.jpg"
-                        if self.image_handler.add_text_watermark(temp_path, watermarked_path, watermark_text):
-                            # Replace original with watermarked version
-                            os.unlink(temp_path)
-                            temp_path = watermarked_path
-                            logger.debug(f"Applied watermark to image: {watermark_text}")
-                
-                return temp_path
-                
-            except Exception as e:
-                # Clean up on error
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-                logger.error(f"Error downloading/preparing media: {e}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error in media preparation: {e}")
-            return None
-    
     async def _send_message(self, bot, chat_id: int, content: Dict[str, Any], 
-                          media_file: Optional[str], reply_to_msg_id: Optional[int]) -> Optional[Any]:
+                          media_file: Optional[Union[str, bytes]], reply_to_msg_id: Optional[int]) -> Optional[Any]:
         """Send message using bot"""
         try:
             # Prepare message parameters
@@ -573,15 +762,16 @@ class MessageProcessor:
                 # Convert Telethon entities to python-telegram-bot format if needed
                 kwargs['entities'] = entities
             
-            # Send with or without media
-            if media_file and os.path.exists(media_file):
+            # Send with or without media; in-memory media is always an image
+            if isinstance(media_file, bytes):
+                sent_message = await bot.send_photo(photo=media_file, **kwargs)
+            elif media_file and (media_data := await asyncio.to_thread(_read_file_if_exists, media_file)) is not None:
                 # Determine media type and send accordingly
+                filename = os.path.basename(media_file)
                 if media_file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                    with open(media_file, 'rb') as f:
-                        sent_message = await bot.send_photo(photo=f, **kwargs)
+                    sent_message = await bot.send_photo(photo=media_data, filename=filename, **kwargs)
                 else:
-                    with open(media_file, 'rb') as f:
-                        sent_message = await bot.send_document(document=f, **kwargs)
+                    sent_message = await bot.send_document(document=media_data, filename=filename, **kwargs)
             else:
                 # Text-only message
                 if kwargs['text']:
@@ -648,15 +838,9 @@ class MessageProcessor:
     def _get_message_type(self, event) -> str:
         """Get message type from event"""
         try:
-            if event.media:
-                from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
-                
-                if isinstance(event.media, MessageMediaPhoto):
-                    return "photo"
-                elif isinstance(event.media, MessageMediaDocument):
-                    return "document"
-                else:
-                    return "media"
+            media = event.media
+            if media:
+                return _MEDIA_TYPE_NAMES.get(type(media), "media")
             elif event.text:
                 return "text"
             else:
@@ -665,12 +849,11 @@ class MessageProcessor:
         except Exception:
             return "unknown"
     
-    def get_stats(self) -> Dict[str, Any]:
+    def get_stats(self) -> Dict[str, int]:
         """Get processing statistics"""
-        return self.stats.copy()
+        return asdict(self.stats)
     
     def reset_stats(self):
         """Reset processing statistics"""
-        for key in self.stats:
-            self.stats[key] = 0
+        self.stats = TopicProcessorStats()
         logger.info("Processing statistics reset")
\ No newline at end of file